@@ -5,3 +5,6 @@ class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api.core'
     verbose_name = 'Core'
+
+    def ready(self):
+        from api.core import signals  # noqa: F401
@@ -0,0 +1,127 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.checks import Error, Tags, register
+
+COURSE_DETAIL_CACHE_TIMEOUT = 60 * 60
+COURSE_FACETS_CACHE_TIMEOUT = 10 * 60
+COURSE_PLAYER_CACHE_TIMEOUT = 60
+ENROLLED_COURSES_CACHE_TIMEOUT = 60 * 60
+
+CATALOG_VERSION_KEY = 'catalog:version'
+
+PROCESS_LOCAL_CACHES = ('django.core.cache.backends.locmem.LocMemCache',)
+
+
+@register(Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    """Version bumps only reach other processes through a shared cache"""
+    backend = settings.CACHES.get('default', {}).get('BACKEND')
+    if backend in PROCESS_LOCAL_CACHES and not getattr(settings, 'CACHE_SINGLE_PROCESS', False):
+        return [Error(
+            "The default cache is local to each process, so cache invalidations from other "
+            "workers and management commands are never seen.",
+            hint="Use a shared backend (file-based, Redis, Memcached), or set "
+                 "CACHE_SINGLE_PROCESS=True if a single process does everything.",
+            id='core.E001',
+        )]
+    return []
+
+
+def _course_version_key(course_id):
+    return f'course:{course_id}:version'
+
+
+def _new_version():
+    # Seed from the clock so an evicted counter never restarts at a number
+    # that older payloads were cached under.
+    return time.time_ns()
+
+
+def _get_version(key):
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _new_version(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def _bump_version(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _new_version(), timeout=None)
+
+
+def get_course_version(course_id):
+    """Returns the current cache version of a course, creating it if needed"""
+    return _get_version(_course_version_key(course_id))
+
+
+def get_catalog_version():
+    """Returns the version shared by everything derived from the whole catalog"""
+    return _get_version(CATALOG_VERSION_KEY)
+
+
+def bump_course_version(*course_ids):
+    """Invalidates every cached payload built from the given courses"""
+    for course_id in course_ids:
+        _bump_version(_course_version_key(course_id))
+    _bump_version(CATALOG_VERSION_KEY)
+
+
+def get_course_versions(course_ids):
+    """Batched get_course_version: one cache round trip for the known versions"""
+    keys = {_course_version_key(course_id): course_id for course_id in course_ids}
+    found = cache.get_many(keys)
+    versions = {keys[key]: version for key, version in found.items()}
+    for course_id in course_ids:
+        if course_id not in versions:
+            versions[course_id] = get_course_version(course_id)
+    return versions
+
+
+def course_detail_cache_key(course_id, version=None):
+    if version is None:
+        version = get_course_version(course_id)
+    return f'course:{course_id}:detail:v{version}'
+
+
+def course_review_summary_cache_key(course_id):
+    """Rating summary of a course, kept under the same version as its detail payload"""
+    return f'course:{course_id}:review_summary:v{get_course_version(course_id)}'
+
+
+def course_facets_cache_key(params):
+    """Key for the facet counts of one filter combination, tied to the catalog version"""
+    digest = hashlib.md5(repr(sorted(params.items())).encode()).hexdigest()
+    return f'catalog:facets:v{get_catalog_version()}:{digest}'
+
+
+def enrolled_courses_cache_key(user_id):
+    return f'user:{user_id}:enrolled_courses'
+
+
+def _completion_version_key(course_id, user_id):
+    return f'course:{course_id}:completions:{user_id}:version'
+
+
+def course_player_cache_key(course_id, user_id):
+    """
+    Per-student player payload; lesson edits move it along with the course
+    version and the student's completions with their completion version
+    """
+    versions = cache.get_many([_course_version_key(course_id), _completion_version_key(course_id, user_id)])
+    course_version = versions.get(_course_version_key(course_id)) or get_course_version(course_id)
+    completion_version = (
+        versions.get(_completion_version_key(course_id, user_id))
+        or _get_version(_completion_version_key(course_id, user_id))
+    )
+    return f'course:{course_id}:player:{user_id}:v{course_version}.{completion_version}'
+
+
+def bump_completion_version(course_id, user_id):
+    """Moves a student's player payload along after their completions change, queued or applied"""
+    _bump_version(_completion_version_key(course_id, user_id))
@@ -0,0 +1,191 @@
+"""
+Write-behind buffer for lesson completion events.
+
+With ``LESSON_COMPLETION_WRITE_BEHIND`` enabled, the single-lesson
+complete/incomplete endpoints append an event to a local SQLite file
+(``LESSON_COMPLETION_QUEUE_PATH``) and answer with an optimistic progress
+instead of writing to the database. The ``flush_completion_queue`` worker
+coalesces queued events per enrollment, keeping the last event for each
+lesson, and applies them through ``Enrollment.apply_lesson_completions``:
+one bulk insert/delete and one progress update per enrollment per flush.
+
+The worker is the only flusher: request paths never apply events, they
+merge the pending ones into what they read (``optimistic_state``,
+``pending_for``). Each flush claims its rows under ``BEGIN IMMEDIATE`` and
+skips enrollments with rows claimed by another flusher, so even a second
+worker can't apply an older batch of an enrollment after a newer one.
+Claimed rows are removed only after they are applied, so a crash replays
+them once the claim expires; applying an event twice is harmless.
+"""
+import sqlite3
+import threading
+import time
+import uuid
+
+from django.conf import settings
+
+from .models import Enrollment, Lesson
+
+_local = threading.local()
+
+# Claims older than this are treated as left behind by a crashed flusher
+CLAIM_TIMEOUT = 5 * 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS completion_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    enrollment_id INTEGER NOT NULL,
+    lesson_id INTEGER NOT NULL,
+    completed INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    claim TEXT,
+    claimed_at REAL
+);
+CREATE INDEX IF NOT EXISTS completion_events_enrollment_idx
+    ON completion_events (enrollment_id, id);
+"""
+
+# Queue files created before claims existed
+CLAIM_COLUMNS = (('claim', 'TEXT'), ('claimed_at', 'REAL'))
+
+
+def is_enabled():
+    return settings.LESSON_COMPLETION_WRITE_BEHIND
+
+
+def _connection():
+    path = settings.LESSON_COMPLETION_QUEUE_PATH
+    connection = getattr(_local, 'connection', None)
+    if connection is None or getattr(_local, 'path', None) != path:
+        connection = sqlite3.connect(path, timeout=30, isolation_level=None)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=FULL')
+        connection.executescript(SCHEMA)
+        columns = {row[1] for row in connection.execute('PRAGMA table_info(completion_events)')}
+        for name, column_type in CLAIM_COLUMNS:
+            if name not in columns:
+                connection.execute(f'ALTER TABLE completion_events ADD COLUMN {name} {column_type}')
+        _local.connection, _local.path = connection, path
+    return connection
+
+
+def enqueue(enrollment_id, lesson_id, completed=True):
+    """Durably records a completion (or un-completion) event"""
+    enqueue_many(enrollment_id, **{'completed' if completed else 'incomplete': [lesson_id]})
+
+
+def enqueue_many(enrollment_id, completed=(), incomplete=()):
+    """Durably records a batch of events, in one transaction"""
+    now = time.time()
+    events = [(enrollment_id, lesson_id, 1, now) for lesson_id in completed]
+    events += [(enrollment_id, lesson_id, 0, now) for lesson_id in incomplete]
+    connection = _connection()
+    connection.execute('BEGIN IMMEDIATE')
+    try:
+        connection.executemany(
+            'INSERT INTO completion_events (enrollment_id, lesson_id, completed, created_at) '
+            'VALUES (?, ?, ?, ?)',
+            events
+        )
+    except BaseException:
+        connection.execute('ROLLBACK')
+        raise
+    connection.execute('COMMIT')
+
+
+def pending_for(enrollment_id):
+    """Queued, not yet applied state of an enrollment's lessons: {lesson_id: completed}"""
+    rows = _connection().execute(
+        'SELECT lesson_id, completed FROM completion_events WHERE enrollment_id = ? ORDER BY id',
+        (enrollment_id,)
+    )
+    return {lesson_id: bool(completed) for lesson_id, completed in rows}
+
+
+def optimistic_state(enrollment):
+    """
+    Completed lesson IDs and progress of an enrollment as they will be once
+    the queue is flushed. Only reads the database.
+    """
+    completed = set(enrollment.completed_lessons.filter(is_active=True).values_list('id', flat=True))
+    pending = pending_for(enrollment.pk)
+    # Progress only counts active lessons, queued ones included
+    active = set(Lesson.objects.filter(
+        pk__in=[lesson_id for lesson_id, is_completed in pending.items() if is_completed], is_active=True
+    ).values_list('id', flat=True)) if any(pending.values()) else set()
+    for lesson_id, is_completed in pending.items():
+        if is_completed and lesson_id in active:
+            completed.add(lesson_id)
+        elif not is_completed:
+            completed.discard(lesson_id)
+
+    total_lessons = enrollment.course.active_lessons
+    progress = min(int((len(completed) / total_lessons) * 100), 100) if total_lessons else 0
+    return sorted(completed), progress
+
+
+def _claim(connection, batch_size):
+    """
+    Marks up to ``batch_size`` of the oldest unclaimed events as taken by a
+    new claim and returns them, leaving out enrollments that another
+    flusher is still working on.
+    """
+    claim, now = uuid.uuid4().hex, time.time()
+    expired = now - CLAIM_TIMEOUT
+    connection.execute('BEGIN IMMEDIATE')
+    try:
+        connection.execute(
+            'UPDATE completion_events SET claim = ?, claimed_at = ? WHERE id IN ('
+            ' SELECT id FROM completion_events'
+            ' WHERE (claim IS NULL OR claimed_at < ?) AND enrollment_id NOT IN ('
+            '  SELECT enrollment_id FROM completion_events WHERE claim IS NOT NULL AND claimed_at >= ?'
+            ' ) ORDER BY id LIMIT ?'
+            ')',
+            (claim, now, expired, expired, batch_size)
+        )
+        rows = connection.execute(
+            'SELECT enrollment_id, lesson_id, completed FROM completion_events '
+            'WHERE claim = ? ORDER BY id',
+            (claim,)
+        ).fetchall()
+    except BaseException:
+        connection.execute('ROLLBACK')
+        raise
+    connection.execute('COMMIT')
+    return claim, rows
+
+
+def flush(batch_size=1000):
+    """
+    Applies a batch of queued events, oldest first. Returns the number of
+    events applied. Only the ``flush_completion_queue`` worker calls this.
+    """
+    connection = _connection()
+    claim, rows = _claim(connection, batch_size)
+    if not rows:
+        return 0
+
+    # Last event per (enrollment, lesson) wins
+    states = {}
+    for row_enrollment_id, lesson_id, completed in rows:
+        states.setdefault(row_enrollment_id, {})[lesson_id] = bool(completed)
+
+    enrollments = Enrollment.objects.in_bulk(list(states))
+    for row_enrollment_id, lessons in states.items():
+        enrollment = enrollments.get(row_enrollment_id)
+        if enrollment is None:
+            continue
+        enrollment.apply_lesson_completions(
+            completed=[lesson_id for lesson_id, completed in lessons.items() if completed],
+            incomplete=[lesson_id for lesson_id, completed in lessons.items() if not completed],
+        )
+
+    connection.execute('DELETE FROM completion_events WHERE claim = ?', (claim,))
+    return len(rows)
+
+
+def flush_all(batch_size=1000):
+    total = 0
+    while count := flush(batch_size=batch_size):
+        total += count
+    return total
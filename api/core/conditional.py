@@ -0,0 +1,47 @@
+import hashlib
+from functools import wraps
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+
+
+def conditional_view(state_func):
+    """
+    Conditional GET support for read-mostly endpoints.
+
+    ``state_func(request, *args, **kwargs)`` returns a token built from cheap
+    aggregates and cache versions, or ``None`` when the view should simply
+    run. The strong ETag hashes the token together with the path and query
+    string, so a matching ``If-None-Match`` gets a 304 before anything is
+    serialized.
+
+    Only the ETag is sent: a Last-Modified taken from ``MAX(updated_at)``
+    doesn't move on deletes or counter UPDATEs, so ``If-Modified-Since``
+    alone would get stale 304s. The token has to cover those instead.
+
+    Apply it below ``@api_view`` so authentication and permissions still run.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def inner(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view_func(request, *args, **kwargs)
+
+            token = state_func(request, *args, **kwargs)
+            if token is None:
+                return view_func(request, *args, **kwargs)
+
+            digest = hashlib.md5(
+                repr((request.path, sorted(request.GET.lists()), token)).encode()
+            ).hexdigest()
+            etag = quote_etag(digest)
+
+            response = get_conditional_response(request, etag=etag)
+            if response is None:
+                response = view_func(request, *args, **kwargs)
+
+            if response.status_code == 200 and not response.has_header('ETag'):
+                response.headers['ETag'] = etag
+            return response
+        return inner
+    return decorator
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from api.core.snapshot import build_snapshot, snapshot_dir
+
+
+class Command(BaseCommand):
+    help = "Writes the precompressed catalog snapshot served to anonymous clients"
+
+    def handle(self, *args, **options):
+        manifest = build_snapshot()
+        pages = sum(len(entries) for entries in manifest.values())
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {pages} catalog pages to {snapshot_dir()}"
+        ))
@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.core.completion_queue import flush_all
+
+
+class Command(BaseCommand):
+    help = "Applies queued write-behind lesson completion events in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Drain the queue and exit")
+        parser.add_argument('--interval', type=float, default=1, help="Seconds between flushes")
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        while True:
+            count = flush_all(batch_size=options['batch_size'])
+            if count:
+                self.stdout.write(f"Applied {count} lesson completion events")
+            if options['once']:
+                break
+            time.sleep(options['interval'])
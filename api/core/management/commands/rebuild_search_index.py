@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from api.core.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the course full-text search index from the Course table"
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        count = backend.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexed {count} courses with {type(backend).__name__}"
+        ))
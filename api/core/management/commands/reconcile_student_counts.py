@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from api.core.caching import bump_course_version
+from api.core.models import Course, CourseStudentCountShard, Enrollment
+from api.core.snapshot import COURSES, course_pages_for, schedule_rebuild
+
+
+class Command(BaseCommand):
+    help = (
+        "Recomputes Course.students from active enrollments, folding in the "
+        "sharded counters of hot courses and fixing any drift. Run periodically."
+    )
+
+    def handle(self, *args, **options):
+        active_count = Coalesce(Subquery(
+            Enrollment.objects.filter(course=OuterRef('pk'), is_active=True)
+            .order_by().values('course').annotate(total=Count('pk')).values('total')
+        ), 0)
+
+        with transaction.atomic():
+            CourseStudentCountShard.objects.all().delete()
+            drifted = list(
+                Course.objects.annotate(actual=active_count)
+                .exclude(students=F('actual'))
+                .values_list('pk', flat=True)
+            )
+            Course.objects.filter(pk__in=drifted).update(students=active_count)
+
+        # Counter updates skip the save signals, so refresh derived payloads here
+        if drifted:
+            bump_course_version(*drifted)
+            schedule_rebuild(COURSES, course_pages_for(Course.objects.filter(pk__in=drifted)))
+        self.stdout.write(self.style.SUCCESS(f"Reconciled {len(drifted)} course student counts"))
@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.core.progress import run_pending_jobs
+
+
+class Command(BaseCommand):
+    help = "Background worker that recomputes enrollment progress for courses whose lessons changed"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Drain the queue and exit")
+        parser.add_argument('--interval', type=float, default=5, help="Seconds between polls")
+
+    def handle(self, *args, **options):
+        while True:
+            count = run_pending_jobs()
+            if count:
+                self.stdout.write(f"Ran {count} progress recompute jobs")
+            if options['once']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.core.snapshot import run_pending_rebuilds
+
+
+class Command(BaseCommand):
+    help = "Background worker that rewrites the catalog snapshot pages queued by course and category changes"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Drain the queue and exit")
+        parser.add_argument('--interval', type=float, default=5, help="Seconds between polls")
+
+    def handle(self, *args, **options):
+        while True:
+            count = run_pending_rebuilds()
+            if count:
+                self.stdout.write(f"Handled {count} queued snapshot rebuilds")
+            if options['once']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,45 @@
+from django.db import migrations
+
+
+def create_course_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+
+    Course = apps.get_model('core', 'Course')
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS core_course_fts USING fts5("
+            "title, description, what_you_will_learn, category, "
+            "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+        )
+        # Title and category matches outrank hits buried in the description.
+        cursor.execute(
+            "INSERT INTO core_course_fts (core_course_fts, rank) "
+            "VALUES ('rank', 'bm25(10.0, 1.0, 3.0, 5.0)')"
+        )
+        for course in Course.objects.select_related('category').iterator():
+            learn = course.what_you_will_learn if isinstance(course.what_you_will_learn, list) else []
+            cursor.execute(
+                "INSERT INTO core_course_fts (rowid, title, description, what_you_will_learn, category) "
+                "VALUES (%s, %s, %s, %s, %s)",
+                [course.pk, course.title, course.description,
+                 '\n'.join(str(item) for item in learn), course.category.title]
+            )
+
+
+def drop_course_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("DROP TABLE IF EXISTS core_course_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_remove_enrollment_payment_intent_id_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_course_search_index, drop_course_search_index),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.3 on 2026-10-17 06:11
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_effective_price(apps, schema_editor):
+    Course = apps.get_model('core', 'Course')
+    Course.objects.update(effective_price=models.Case(
+        models.When(discount_price__isnull=False, then=models.F('discount_price')),
+        default=models.F('price'),
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_hot_filter_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='effective_price',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_effective_price, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['effective_price', 'id'], name='course_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['rating', 'id'], name='course_rating_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['students', 'id'], name='course_students_idx'),
+        ),
+    ]
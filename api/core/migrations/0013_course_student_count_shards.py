@@ -0,0 +1,26 @@
+# Generated by Django 5.2.3 on 2026-10-17 06:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_course_effective_price_and_sort_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseStudentCountShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shard', models.PositiveSmallIntegerField()),
+                ('count', models.IntegerField(default=0)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='student_count_shards', to='core.course')),
+            ],
+            options={
+                'unique_together': {('course', 'shard')},
+            },
+        ),
+    ]
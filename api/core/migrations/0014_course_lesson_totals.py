@@ -0,0 +1,48 @@
+# Generated by Django 5.2.3 on 2026-10-17 06:16
+
+from django.db import migrations, models
+
+
+def parse_duration(value):
+    # Frozen copy of api.core.models.parse_duration as of this migration
+    seconds = 0
+    try:
+        for part in value.split(':'):
+            seconds = seconds * 60 + int(part)
+    except (AttributeError, ValueError):
+        return 0
+    return max(seconds, 0)
+
+
+def fill_lesson_totals(apps, schema_editor):
+    Course = apps.get_model('core', 'Course')
+    Lesson = apps.get_model('core', 'Lesson')
+    totals = {}
+    for course_id, duration in Lesson.objects.filter(is_active=True).values_list('course_id', 'duration'):
+        lessons, seconds = totals.get(course_id, (0, 0))
+        totals[course_id] = (lessons + 1, seconds + parse_duration(duration))
+    for course_id, (lessons, seconds) in totals.items():
+        Course.objects.filter(pk=course_id).update(
+            active_lessons=lessons, active_lessons_duration=seconds
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_course_student_count_shards'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='active_lessons',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='active_lessons_duration',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_lesson_totals, migrations.RunPython.noop),
+    ]
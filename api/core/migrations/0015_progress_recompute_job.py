@@ -0,0 +1,30 @@
+# Generated by Django 5.2.3 on 2026-10-17 06:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_course_lesson_totals'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProgressRecomputeJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('enrollments_updated', models.PositiveIntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='progress_jobs', to='core.course')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'created_at'], name='progress_job_status_idx'), models.Index(fields=['course', '-created_at'], name='progress_job_course_idx')],
+            },
+        ),
+    ]
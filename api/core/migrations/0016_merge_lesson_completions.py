@@ -0,0 +1,89 @@
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.db.models.lookups import GreaterThanOrEqual
+
+
+def merge_completions(apps, schema_editor):
+    Enrollment = apps.get_model('core', 'Enrollment')
+    LessonCompletion = apps.get_model('core', 'LessonCompletion')
+    CompletedLesson = Enrollment.completed_lessons.through
+
+    # Progress has always been computed from the M2M, so it decides what is
+    # completed in both directions; LessonCompletion contributes the
+    # completion time of the rows it keeps.
+    m2m_pairs = set(CompletedLesson.objects.values_list('enrollment_id', 'lesson_id'))
+    stale = [
+        pk for pk, enrollment_id, lesson_id
+        in LessonCompletion.objects.values_list('pk', 'enrollment_id', 'lesson_id')
+        if (enrollment_id, lesson_id) not in m2m_pairs
+    ]
+    for start in range(0, len(stale), 500):
+        LessonCompletion.objects.filter(pk__in=stale[start:start + 500]).delete()
+
+    existing = set(LessonCompletion.objects.values_list('enrollment_id', 'lesson_id'))
+    LessonCompletion.objects.bulk_create(
+        [
+            LessonCompletion(enrollment_id=enrollment_id, lesson_id=lesson_id)
+            for enrollment_id, lesson_id in m2m_pairs - existing
+        ],
+        batch_size=500,
+    )
+    recompute_progress(apps)
+
+
+def recompute_progress(apps):
+    # Same rule as Enrollment.update_progress at this point in history
+    Course = apps.get_model('core', 'Course')
+    Enrollment = apps.get_model('core', 'Enrollment')
+    LessonCompletion = apps.get_model('core', 'LessonCompletion')
+    completed = Coalesce(Subquery(
+        LessonCompletion.objects.filter(
+            enrollment_id=OuterRef('pk'), lesson__is_active=True
+        ).order_by().values('enrollment_id').annotate(total=Count('pk')).values('total')
+    ), 0)
+    for course_id, total_lessons in Course.objects.values_list('pk', 'active_lessons'):
+        enrollments = Enrollment.objects.filter(course_id=course_id)
+        if not total_lessons:
+            enrollments.update(progress=0, is_completed=False)
+            continue
+        # Integer division truncates like int() in update_progress
+        progress = completed * 100 / Value(total_lessons)
+        enrollments.update(progress=progress, is_completed=GreaterThanOrEqual(progress, 100))
+
+
+def split_completions(apps, schema_editor):
+    Enrollment = apps.get_model('core', 'Enrollment')
+    LessonCompletion = apps.get_model('core', 'LessonCompletion')
+    CompletedLesson = Enrollment.completed_lessons.through
+    CompletedLesson.objects.bulk_create(
+        [
+            CompletedLesson(enrollment_id=enrollment_id, lesson_id=lesson_id)
+            for enrollment_id, lesson_id in LessonCompletion.objects.values_list('enrollment_id', 'lesson_id')
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_progress_recompute_job'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_completions, split_completions),
+        migrations.RemoveField(
+            model_name='enrollment',
+            name='completed_lessons',
+        ),
+        migrations.RemoveField(
+            model_name='lessoncompletion',
+            name='is_completed',
+        ),
+        migrations.AddField(
+            model_name='enrollment',
+            name='completed_lessons',
+            field=models.ManyToManyField(blank=True, through='core.LessonCompletion', to='core.lesson'),
+        ),
+    ]
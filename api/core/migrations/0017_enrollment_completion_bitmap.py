@@ -0,0 +1,56 @@
+# Generated by Django 5.2.3 on 2026-10-17 06:22
+
+from django.db import migrations, models
+
+
+def set_bitmap_positions(bitmap, positions, value):
+    # Frozen copy of api.core.models.set_bitmap_positions as of this migration
+    bits = bytearray(bitmap)
+    for position in positions:
+        index, bit = divmod(position, 8)
+        if value:
+            if index >= len(bits):
+                bits.extend(bytes(index + 1 - len(bits)))
+            bits[index] |= 1 << bit
+        elif index < len(bits):
+            bits[index] &= ~(1 << bit)
+    return bytes(bits).rstrip(b'\0')
+
+
+def fill_completion_bitmaps(apps, schema_editor):
+    Enrollment = apps.get_model('core', 'Enrollment')
+    LessonCompletion = apps.get_model('core', 'LessonCompletion')
+    positions = {}
+    for enrollment_id, sequence_number in LessonCompletion.objects.values_list(
+        'enrollment_id', 'lesson__sequence_number'
+    ):
+        positions.setdefault(enrollment_id, []).append(sequence_number - 1)
+    Enrollment.objects.bulk_update(
+        [
+            Enrollment(pk=enrollment_id, completion_bitmap=set_bitmap_positions(b'', bits, True))
+            for enrollment_id, bits in positions.items()
+        ],
+        ['completion_bitmap'],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_merge_lesson_completions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='enrollment',
+            name='completion_bitmap',
+            field=models.BinaryField(default=b''),
+        ),
+        migrations.AddField(
+            model_name='progressrecomputejob',
+            name='rebuild_bitmaps',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(fill_completion_bitmaps, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,80 @@
+# Generated by Django 5.2.3 on 2026-10-17 07:17
+
+from django.db import migrations, models
+
+
+def set_bitmap_positions(bitmap, positions, value):
+    # Frozen copy of api.core.models.set_bitmap_positions as of this migration
+    bits = bytearray(bitmap)
+    for position in positions:
+        index, bit = divmod(position, 8)
+        if value:
+            if index >= len(bits):
+                bits.extend(bytes(index + 1 - len(bits)))
+            bits[index] |= 1 << bit
+        elif index < len(bits):
+            bits[index] &= ~(1 << bit)
+    return bytes(bits).rstrip(b'\0')
+
+
+def rewrite_bitmaps(apps, lesson_field, offset=0):
+    """Sets each enrollment's bits at ``lesson_field + offset`` of its completed lessons"""
+    Enrollment = apps.get_model('core', 'Enrollment')
+    LessonCompletion = apps.get_model('core', 'LessonCompletion')
+    positions = {}
+    for enrollment_id, position in LessonCompletion.objects.values_list(
+        'enrollment_id', f'lesson__{lesson_field}'
+    ):
+        positions.setdefault(enrollment_id, []).append(position + offset)
+
+    Enrollment.objects.exclude(completion_bitmap=b'').update(completion_bitmap=b'')
+    Enrollment.objects.bulk_update(
+        [
+            Enrollment(pk=enrollment_id, completion_bitmap=set_bitmap_positions(b'', bits, True))
+            for enrollment_id, bits in positions.items()
+        ],
+        ['completion_bitmap'],
+        batch_size=500,
+    )
+
+
+def assign_completion_slots(apps, schema_editor):
+    # Dense slots in the current lesson order of each course
+    Course = apps.get_model('core', 'Course')
+    Lesson = apps.get_model('core', 'Lesson')
+    slots = {}
+    lessons = []
+    for lesson in Lesson.objects.order_by('course_id', 'sequence_number', 'id').only('course_id'):
+        lesson.completion_slot = slots.get(lesson.course_id, 0)
+        slots[lesson.course_id] = lesson.completion_slot + 1
+        lessons.append(lesson)
+    Lesson.objects.bulk_update(lessons, ['completion_slot'], batch_size=500)
+    for course_id, count in slots.items():
+        Course.objects.filter(pk=course_id).update(completion_slots=count)
+    rewrite_bitmaps(apps, 'completion_slot')
+
+
+def restore_sequence_positions(apps, schema_editor):
+    # Bits at sequence_number - 1, as before this migration
+    rewrite_bitmaps(apps, 'sequence_number', offset=-1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0020_snapshot_rebuild_queue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='completion_slots',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='lesson',
+            name='completion_slot',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(assign_completion_slots, restore_sequence_positions),
+    ]
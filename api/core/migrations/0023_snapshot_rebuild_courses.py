@@ -0,0 +1,28 @@
+# Generated by Django 5.2.3 on 2026-10-17 07:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0022_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='snapshotrebuild',
+            name='claimed',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='snapshotrebuild',
+            name='course_id',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='snapshotrebuild',
+            name='page',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+    ]
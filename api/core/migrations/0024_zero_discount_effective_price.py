@@ -0,0 +1,20 @@
+# Generated by Django 5.2.3 on 2026-10-17 08:02
+
+from django.db import migrations
+
+
+def fill_zero_discounts(apps, schema_editor):
+    # 0012 used to skip discount_price = 0, which is a real (free) discount
+    Course = apps.get_model('core', 'Course')
+    Course.objects.filter(discount_price=0).update(effective_price=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0023_snapshot_rebuild_courses'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_zero_discounts, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,30 @@
-from django.db import models
+import random
+
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import F, Q
+from django.db.models.functions import Cast, Coalesce, Greatest, NullIf, Round
 from api.accounts.models import User
+from django.core.cache import cache
+from .caching import (
+    ENROLLED_COURSES_CACHE_TIMEOUT,
+    bump_completion_version,
+    bump_course_version,
+    enrolled_courses_cache_key,
+)
+
+
+def course_counters_changed(course_id):
+    """
+    Invalidates cached course payloads after a counter UPDATE, which skips
+    the post_save handlers that normally do it. This sits on the enrollment
+    and review write paths, so beyond the version bump it only queues the
+    course for the snapshot worker, once until the worker takes it.
+    """
+    from .snapshot import schedule_course_rebuild  # snapshot imports this module
+
+    transaction.on_commit(lambda: bump_course_version(course_id))
+    schedule_course_rebuild(course_id)
 
 
 class Category(models.Model):
@@ -8,10 +33,50 @@ class Category(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # category_list keyset pages on (created_at, id)
+            models.Index(fields=['created_at', 'id'], name='category_created_idx'),
+        ]
+
     def __str__(self):
         return self.title
 
 
+def parse_duration(value):
+    """Seconds in a lesson duration such as "05:30" or "1:05:30"; 0 if malformed"""
+    seconds = 0
+    try:
+        for part in value.split(':'):
+            seconds = seconds * 60 + int(part)
+    except (AttributeError, ValueError):
+        return 0
+    return max(seconds, 0)
+
+
+def set_bitmap_positions(bitmap, positions, value):
+    """Returns ``bitmap`` with the bits at ``positions`` set (or cleared), trailing zero bytes trimmed"""
+    bits = bytearray(bitmap)
+    for position in positions:
+        index, bit = divmod(position, 8)
+        if value:
+            if index >= len(bits):
+                bits.extend(bytes(index + 1 - len(bits)))
+            bits[index] |= 1 << bit
+        elif index < len(bits):
+            bits[index] &= ~(1 << bit)
+    return bytes(bits).rstrip(b'\0')
+
+
+def bitmap_positions(bitmap):
+    """The set of positions whose bit is set in ``bitmap``"""
+    return {
+        index * 8 + bit
+        for index, byte in enumerate(bytes(bitmap)) if byte
+        for bit in range(8) if byte >> bit & 1
+    }
+
+
 class Course(models.Model):
     LEVEL_CHOICES = [
         ('Beginner', 'Beginner'),
@@ -24,10 +89,26 @@ class Course(models.Model):
     banner = models.URLField()
     price = models.FloatField()
     discount_price = models.FloatField(null=True, blank=True)
+    # discount_price when set, else price; kept by save() so sorts can use an index
+    effective_price = models.FloatField(default=0, editable=False)
     duration = models.CharField(max_length=100) 
     rating = models.FloatField(default=0.0)
     reviews = models.PositiveIntegerField(default=0)
+    # Running totals of approved review ratings; rating and reviews derive from them
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    rating_count = models.PositiveIntegerField(default=0, editable=False)
+    # Approved review counts per star, for the distribution bar
+    rating_1 = models.PositiveIntegerField(default=0, editable=False)
+    rating_2 = models.PositiveIntegerField(default=0, editable=False)
+    rating_3 = models.PositiveIntegerField(default=0, editable=False)
+    rating_4 = models.PositiveIntegerField(default=0, editable=False)
+    rating_5 = models.PositiveIntegerField(default=0, editable=False)
     students = models.PositiveIntegerField(default=0)
+    # Active lesson count and their total duration in seconds, kept by Lesson
+    active_lessons = models.PositiveIntegerField(default=0, editable=False)
+    active_lessons_duration = models.PositiveIntegerField(default=0, editable=False)
+    # Completion bitmap slots handed out to lessons so far, see Lesson.completion_slot
+    completion_slots = models.PositiveIntegerField(default=0, editable=False)
     start_date = models.DateField(null=True, blank=True)
     is_featured = models.BooleanField(default=False)
     level = models.CharField(max_length=20, choices=LEVEL_CHOICES, default='Beginner')
@@ -38,8 +119,40 @@ class Course(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Catalog filters (category, level, featured) ordered by newest
+            models.Index(fields=['category', 'level', 'is_featured', '-created_at'], name='course_catalog_filter_idx'),
+            # Unfiltered catalog and keyset pagination on (created_at, id)
+            models.Index(fields=['created_at', 'id'], name='course_created_idx'),
+            # Catalog sort options, tie-broken on id for keyset pagination
+            models.Index(fields=['effective_price', 'id'], name='course_price_idx'),
+            models.Index(fields=['rating', 'id'], name='course_rating_idx'),
+            models.Index(fields=['students', 'id'], name='course_students_idx'),
+        ]
+
     def __str__(self):
         return self.title
+
+    # Kept with F() UPDATEs, so a plain save() of a loaded course leaves them
+    # alone instead of overwriting concurrent changes with the values it read.
+    # Pass them in update_fields to write them.
+    COUNTER_FIELDS = frozenset({
+        'students', 'rating', 'reviews', 'rating_sum', 'rating_count',
+        'rating_1', 'rating_2', 'rating_3', 'rating_4', 'rating_5',
+        'active_lessons', 'active_lessons_duration', 'completion_slots',
+    })
+
+    def save(self, *args, **kwargs):
+        self.effective_price = self.price if self.discount_price is None else self.discount_price
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None and not self._state.adding and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = {
+                field.name for field in self._meta.concrete_fields if not field.primary_key
+            } - self.COUNTER_FIELDS
+        elif update_fields is not None and {'price', 'discount_price'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'effective_price'}
+        super().save(*args, **kwargs)
     
     @property
     def enrolled_students_count(self):
@@ -48,8 +161,111 @@ class Course(models.Model):
     
     def update_students_count(self):
         """Updates the students field with the current enrollment count"""
-        self.students = self.enrolled_students_count
-        self.save()
+        with transaction.atomic():
+            self.student_count_shards.all().delete()
+            self.students = self.enrolled_students_count
+            self.save(update_fields=['students', 'updated_at'])
+
+    @classmethod
+    def adjust_students_count(cls, course_id, delta, hot=False):
+        """
+        Applies an enrollment delta without reading or rewriting the Course row.
+        Hot courses spread the writes over CourseStudentCountShard rows so
+        concurrent enrollments don't queue on one row lock; the
+        reconcile_student_counts job folds them back into ``students``.
+        """
+        if hot:
+            shard = random.randrange(settings.STUDENT_COUNT_SHARDS)
+            shards = CourseStudentCountShard.objects.filter(course_id=course_id, shard=shard)
+            if not shards.update(count=F('count') + delta):
+                CourseStudentCountShard.objects.bulk_create(
+                    [CourseStudentCountShard(course_id=course_id, shard=shard)],
+                    ignore_conflicts=True
+                )
+                shards.update(count=F('count') + delta)
+            return
+
+        cls.objects.filter(pk=course_id).update(students=Greatest(F('students') + delta, 0))
+        course_counters_changed(course_id)
+
+
+    RATING_STARS = range(1, 6)
+
+    @property
+    def rating_histogram(self):
+        """Approved review counts keyed by star, 1 through 5"""
+        return {star: getattr(self, f'rating_{star}') for star in self.RATING_STARS}
+
+    @classmethod
+    def adjust_rating(cls, course_id, stars):
+        """
+        Applies a change in approved reviews, given as ``{star: count delta}``,
+        to the histogram and rating totals with one UPDATE, refreshing the
+        rounded rating and review count alongside.
+        """
+        stars = {star: delta for star, delta in stars.items() if delta}
+        if not stars:
+            return
+        rating_sum = F('rating_sum') + sum(star * delta for star, delta in stars.items())
+        rating_count = F('rating_count') + sum(stars.values())
+        cls.objects.filter(pk=course_id).update(
+            rating_sum=rating_sum,
+            rating_count=rating_count,
+            reviews=rating_count,
+            rating=Coalesce(Round(Cast(rating_sum, models.FloatField()) / NullIf(rating_count, 0), 1), 0.0),
+            **{f'rating_{star}': F(f'rating_{star}') + delta for star, delta in stars.items()},
+        )
+        course_counters_changed(course_id)
+
+    @classmethod
+    def set_rating_histogram(cls, course_id, stars):
+        """Overwrites the histogram and rating totals with recounted ``{star: count}``"""
+        rating_sum = sum(star * count for star, count in stars.items())
+        rating_count = sum(stars.values())
+        cls.objects.filter(pk=course_id).update(
+            rating_sum=rating_sum,
+            rating_count=rating_count,
+            reviews=rating_count,
+            rating=round(rating_sum / rating_count, 1) if rating_count else 0.0,
+            **{f'rating_{star}': stars.get(star, 0) for star in cls.RATING_STARS},
+        )
+        course_counters_changed(course_id)
+
+    @classmethod
+    def allocate_completion_slot(cls, course_id):
+        """Hands out the next completion bitmap slot of a course; slots are never reused"""
+        with transaction.atomic():
+            cls.objects.filter(pk=course_id).update(completion_slots=F('completion_slots') + 1)
+            return cls.objects.values_list('completion_slots', flat=True).get(pk=course_id) - 1
+
+    @classmethod
+    def adjust_lesson_totals(cls, course_id, lessons, seconds):
+        """Applies a change in active lessons to the stored totals of a course"""
+        if lessons or seconds:
+            cls.objects.filter(pk=course_id).update(
+                active_lessons=F('active_lessons') + lessons,
+                active_lessons_duration=F('active_lessons_duration') + seconds,
+            )
+
+    def update_lesson_totals(self):
+        """Recomputes the stored lesson totals from the lessons themselves"""
+        durations = self.lesson_set.filter(is_active=True).values_list('duration', flat=True)
+        self.active_lessons = len(durations)
+        self.active_lessons_duration = sum(parse_duration(value) for value in durations)
+        self.save(update_fields=['active_lessons', 'active_lessons_duration', 'updated_at'])
+
+
+class CourseStudentCountShard(models.Model):
+    """Pending enrollment delta for a hot course, folded into Course.students periodically"""
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='student_count_shards')
+    shard = models.PositiveSmallIntegerField()
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('course', 'shard')
+
+    def __str__(self):
+        return f"{self.course_id} shard {self.shard}: {self.count}"
 
 
 class CurriculumSection(models.Model):
@@ -70,21 +286,69 @@ class Lesson(models.Model):
     is_preview = models.BooleanField(default=False)
     is_active = models.BooleanField(default=True)
     sequence_number = models.PositiveIntegerField(default=0) 
+    # This lesson's bit in the enrollments' completion bitmaps. Assigned once
+    # per course and kept through reorders, so the bits never need moving.
+    completion_slot = models.PositiveIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['sequence_number']  
         unique_together = ['course', 'sequence_number']
+        indexes = [
+            models.Index(fields=['course', 'is_active'], name='lesson_course_active_idx'),
+            # lesson_list_create keyset pages on (sequence_number, id)
+            models.Index(fields=['sequence_number', 'id'], name='lesson_sequence_idx'),
+        ]
 
     def __str__(self):
         return f"{self.course.title} - {self.title}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if {'course_id', 'is_active', 'duration'} <= instance.__dict__.keys():
+            instance._stored_totals = instance.course_totals()
+        return instance
+
+    def course_totals(self):
+        """(course_id, lessons, seconds) this lesson adds to Course lesson totals"""
+        if not self.is_active:
+            return self.course_id, 0, 0
+        return self.course_id, 1, parse_duration(self.duration)
+
+    def stored_course_totals(self):
+        """course_totals() as of the last load or save of this lesson"""
+        if self._state.adding:
+            return None
+        stored = getattr(self, '_stored_totals', None)
+        if stored is None:
+            previous = Lesson.objects.filter(pk=self.pk).only('course', 'is_active', 'duration').first()
+            stored = previous.course_totals() if previous else None
+        return stored
+
     def save(self, *args, **kwargs):
         if not self.sequence_number or self.sequence_number == 0:
             last_lesson = Lesson.objects.filter(course=self.course).order_by('-sequence_number').first()
             self.sequence_number = last_lesson.sequence_number + 1 if last_lesson else 1
-        super().save(*args, **kwargs)
+
+        with transaction.atomic():
+            previous = self.stored_course_totals()
+            if previous is None or previous[0] != self.course_id:
+                self.completion_slot = Course.allocate_completion_slot(self.course_id)
+            # For the post_save handler that schedules progress recomputes
+            self._previous_totals = previous
+            super().save(*args, **kwargs)
+            current = self.course_totals()
+            if previous and previous[0] == current[0]:
+                Course.adjust_lesson_totals(
+                    current[0], current[1] - previous[1], current[2] - previous[2]
+                )
+            else:
+                if previous:
+                    Course.adjust_lesson_totals(previous[0], -previous[1], -previous[2])
+                Course.adjust_lesson_totals(*current)
+        self._stored_totals = current
 
 
 class Material(models.Model):
@@ -109,7 +373,10 @@ class Enrollment(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     price = models.FloatField()
     progress = models.IntegerField(default=0) 
-    completed_lessons = models.ManyToManyField(Lesson, blank=True) 
+    # Backed by LessonCompletion, the single record of a completed lesson
+    completed_lessons = models.ManyToManyField(Lesson, blank=True, through='LessonCompletion')
+    # One bit per lesson, at its Lesson.completion_slot, set when completed
+    completion_bitmap = models.BinaryField(default=b'', editable=False)
     is_completed = models.BooleanField(default=False)
     payment_currency = models.CharField(max_length=3, default='USD')
     payment_status = models.CharField(max_length=20, blank=True)
@@ -118,31 +385,125 @@ class Enrollment(models.Model):
     total_mark = models.FloatField(default=0)
     is_certificate_ready = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            # Enrollment checks only ever look for active rows
+            models.Index(
+                fields=['user', 'course'], condition=Q(is_active=True),
+                name='enrollment_active_idx'
+            ),
+            models.Index(fields=['course', 'is_active'], name='enrollment_course_active_idx'),
+        ]
+
     def update_progress(self):
-        total_lessons = Lesson.objects.filter(course=self.course, is_active=True).count()
+        total_lessons = Course.objects.values_list('active_lessons', flat=True).get(pk=self.course_id)
         completed_count = self.completed_lessons.filter(is_active=True).count()
         self.progress = int((completed_count / total_lessons) * 100) if total_lessons else 0
         self.is_completed = self.progress == 100
-        self.save()
+        self.save(update_fields=['progress', 'is_completed', 'updated_at'])
+
+    def apply_lesson_completions(self, completed=(), incomplete=()):
+        """
+        Marks lessons of this enrollment's course as completed or incomplete in
+        bulk and recomputes progress once. Lessons already in the requested
+        state are left alone.
+        """
+        positions = dict(Lesson.objects.filter(
+            pk__in=set(completed) | set(incomplete)
+        ).values_list('pk', 'completion_slot'))
+        # Queued events may name lessons deleted since
+        completed = [pk for pk in completed if pk in positions]
+        incomplete = [pk for pk in incomplete if pk in positions]
+
+        with transaction.atomic():
+            if completed:
+                LessonCompletion.objects.bulk_create(
+                    [LessonCompletion(enrollment_id=self.pk, lesson_id=lesson_id) for lesson_id in completed],
+                    ignore_conflicts=True
+                )
+            if incomplete:
+                LessonCompletion.objects.filter(enrollment_id=self.pk, lesson_id__in=incomplete).delete()
+
+            # Re-read under the row lock so concurrent requests don't drop each other's bits
+            bitmap = Enrollment.objects.select_for_update().values_list(
+                'completion_bitmap', flat=True
+            ).get(pk=self.pk)
+            bitmap = set_bitmap_positions(bitmap, [positions[pk] for pk in completed], True)
+            bitmap = set_bitmap_positions(bitmap, [positions[pk] for pk in incomplete], False)
+            Enrollment.objects.filter(pk=self.pk).update(completion_bitmap=bitmap)
+            self.completion_bitmap = bitmap
+
+            self.update_progress()
+            transaction.on_commit(lambda: bump_completion_version(self.course_id, self.user_id))
+
+    @classmethod
+    def active_course_ids(cls, user_id):
+        """IDs of the courses a user is actively enrolled in, cached until their enrollments change"""
+        key = enrolled_courses_cache_key(user_id)
+        course_ids = cache.get(key)
+        if course_ids is None:
+            course_ids = frozenset(cls.objects.filter(
+                user_id=user_id, is_active=True
+            ).values_list('course_id', flat=True))
+            cache.set(key, course_ids, ENROLLED_COURSES_CACHE_TIMEOUT)
+        return course_ids
+
+    @property
+    def completed_positions(self):
+        """Completion slots of the completed lessons, decoded from the bitmap"""
+        return bitmap_positions(self.completion_bitmap)
+
+    @classmethod
+    def rebuild_completion_bitmaps(cls, course_id):
+        """
+        Rewrites the bitmaps of a course's enrollments from LessonCompletion,
+        dropping the bits of lessons deleted or moved to another course
+        """
+        positions = {}
+        for enrollment_id, slot in LessonCompletion.objects.filter(
+            enrollment__course_id=course_id, lesson__course_id=course_id
+        ).values_list('enrollment_id', 'lesson__completion_slot'):
+            positions.setdefault(enrollment_id, []).append(slot)
+
+        with transaction.atomic():
+            cls.objects.filter(course_id=course_id).exclude(completion_bitmap=b'').update(completion_bitmap=b'')
+            cls.objects.bulk_update(
+                [
+                    cls(pk=enrollment_id, completion_bitmap=set_bitmap_positions(b'', bits, True))
+                    for enrollment_id, bits in positions.items()
+                ],
+                ['completion_bitmap'],
+                batch_size=500,
+            )
 
     def __str__(self):
         return f"{self.user.username} - {self.course.title}"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored state so save() can tell whether it changed
+        instance._stored_is_active = instance.__dict__.get('is_active')
+        return instance
+
+    def _adjust_students_count(self, delta):
+        hot = self.course.students >= settings.STUDENT_COUNT_HOT_THRESHOLD
+        Course.adjust_students_count(self.course_id, delta, hot=hot)
+
     def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        self.course.update_students_count()
-    
-    def delete(self, *args, **kwargs):
-        course = self.course
-        super().delete(*args, **kwargs)
-        course.update_students_count()
+        # New rows count as previously inactive
+        was_active = getattr(self, '_stored_is_active', False)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if self.is_active != was_active:
+                self._adjust_students_count(1 if self.is_active else -1)
+        self._stored_is_active = self.is_active
     
     
 class LessonCompletion(models.Model):
     enrollment = models.ForeignKey(Enrollment, on_delete=models.CASCADE, related_name='lesson_completions')
     lesson = models.ForeignKey(Lesson, on_delete=models.CASCADE)
     completed_at = models.DateTimeField(auto_now_add=True)
-    is_completed = models.BooleanField(default=True)
 
     class Meta:
         unique_together = ('enrollment', 'lesson') 
@@ -151,6 +512,52 @@ class LessonCompletion(models.Model):
         return f"{self.enrollment.user.username} completed {self.lesson.title}"
 
 
+class ProgressRecomputeJob(models.Model):
+    """Background recompute of every enrollment's progress in a course"""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='progress_jobs')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    # Lessons were deleted or reordered, so completion bitmaps need rebuilding too
+    rebuild_bitmaps = models.BooleanField(default=False)
+    enrollments_updated = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='progress_job_status_idx'),
+            models.Index(fields=['course', '-created_at'], name='progress_job_course_idx'),
+        ]
+
+    def __str__(self):
+        return f"Progress recompute for {self.course_id}: {self.status}"
+
+
+class SnapshotRebuild(models.Model):
+    """A catalog snapshot page waiting for the run_snapshot_rebuilds worker"""
+    kind = models.CharField(max_length=20)
+    # 0 stands for every page of the listing
+    page = models.PositiveSmallIntegerField(null=True, blank=True)
+    # Counter changes queue the course instead and leave finding its page to the worker
+    course_id = models.PositiveIntegerField(null=True, blank=True)
+    # Taken by a running worker; later changes queue a new row
+    claimed = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        if self.course_id is not None:
+            return f"Snapshot rebuild of the page showing course {self.course_id}"
+        return f"Snapshot rebuild of {self.kind} page {self.page or 'all'}"
+
+
 class QuestionAnswer(models.Model):
     lesson = models.ForeignKey(Lesson, on_delete=models.CASCADE)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
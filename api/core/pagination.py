@@ -0,0 +1,126 @@
+import base64
+import json
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination:
+    """
+    Forward-only cursor pagination for infinite-scroll clients.
+
+    ``ordering`` must end in a unique field (normally ``id``) so that each
+    row has a distinct position. The cursor encodes the ordering and the
+    ordering values of the last row served, and the next page is fetched
+    with a range filter on them, so no COUNT query is issued and deep pages
+    cost the same as the first one. A cursor made under another ordering,
+    or holding values that don't parse as their fields, is rejected with
+    404 like any other invalid cursor.
+    """
+    page_size = 16
+    page_size_query_param = 'limit'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def __init__(self, ordering):
+        self.ordering = tuple(ordering)
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def encode_cursor(self, position):
+        # Keep full microsecond precision; DjangoJSONEncoder truncates
+        # datetimes to milliseconds, which would skip rows on the boundary.
+        data = json.dumps({
+            'ordering': self.ordering,
+            'position': [
+                value.isoformat() if hasattr(value, 'isoformat') else value
+                for value in position
+            ],
+        })
+        return base64.urlsafe_b64encode(data.encode()).decode()
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            data = json.loads(base64.urlsafe_b64decode(encoded.encode()).decode())
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(data, dict) or data.get('ordering') != list(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        position = data.get('position')
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        try:
+            return [
+                self.parse_value(model, field, value)
+                for field, value in zip(self.ordering, position)
+            ]
+        except (FieldDoesNotExist, ValidationError, TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def parse_value(self, model, field, value):
+        """Converts a cursor value back to the Python type of its ordering field"""
+        if value is None or isinstance(value, (list, dict)):
+            raise ValueError(value)
+        return model._meta.get_field(field.lstrip('-')).to_python(value)
+
+    def get_position(self, obj):
+        return [getattr(obj, field.lstrip('-')) for field in self.ordering]
+
+    def get_keyset_filter(self, position):
+        # (a, b, c) > (x, y, z) expanded to a > x OR (a = x AND b > y) OR ...
+        keyset = Q()
+        for index, field in enumerate(self.ordering):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            equal = {
+                previous.lstrip('-'): value
+                for previous, value in zip(self.ordering[:index], position)
+            }
+            keyset |= Q(**equal, **{f'{name}__{lookup}': position[index]})
+
+        # Redundant bound on the leading column so the database can seek
+        # straight to the cursor with a range scan on its index.
+        leading = self.ordering[0]
+        bound = 'lte' if leading.startswith('-') else 'gte'
+        return Q(**{f'{leading.lstrip("-")}__{bound}': position[0]}) & keyset
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+
+        queryset = queryset.order_by(*self.ordering)
+        position = self.decode_cursor(request, queryset.model)
+        if position is not None:
+            queryset = queryset.filter(self.get_keyset_filter(position))
+
+        page = list(queryset[:self.page_size + 1])
+        self.has_next = len(page) > self.page_size
+        page = page[:self.page_size]
+        self.next_position = self.get_position(page[-1]) if self.has_next else None
+        return page
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(
+            url, self.cursor_query_param, self.encode_cursor(self.next_position)
+        )
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
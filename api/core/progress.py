@@ -0,0 +1,94 @@
+"""
+Set-based recomputation of enrollment progress.
+
+Adding, removing or (de)activating lessons changes the denominator of every
+enrollment in the course. Instead of calling ``update_progress()`` once per
+enrollment, the Lesson save/delete handlers (and so the admin too) queue a
+``ProgressRecomputeJob`` and the ``run_progress_jobs`` worker rewrites the
+whole course with one UPDATE.
+"""
+import logging
+
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.db.models.lookups import GreaterThanOrEqual
+from django.utils import timezone
+
+from .models import Course, Enrollment, LessonCompletion, ProgressRecomputeJob
+
+logger = logging.getLogger(__name__)
+
+
+def schedule_progress_recompute(*course_ids, rebuild_bitmaps=False):
+    """
+    Queues a recompute for each course, reusing a job that is still pending
+    so a burst of lesson edits costs one pass. ``rebuild_bitmaps`` also
+    rewrites the enrollments' completion bitmaps, dropping the bits of
+    deleted lessons.
+    """
+    for course_id in set(course_ids):
+        pending = ProgressRecomputeJob.objects.filter(course_id=course_id, status='pending')
+        if rebuild_bitmaps:
+            pending.filter(rebuild_bitmaps=False).update(rebuild_bitmaps=True)
+        if not pending.exists():
+            ProgressRecomputeJob.objects.create(course_id=course_id, rebuild_bitmaps=rebuild_bitmaps)
+
+
+def recompute_course_progress(course_id):
+    """Rewrites progress and is_completed for every enrollment of a course in one UPDATE"""
+    total_lessons = Course.objects.values_list('active_lessons', flat=True).get(pk=course_id)
+    enrollments = Enrollment.objects.filter(course_id=course_id)
+    if not total_lessons:
+        return enrollments.update(progress=0, is_completed=False, updated_at=timezone.now())
+
+    completed = Subquery(
+        LessonCompletion.objects.filter(
+            enrollment_id=OuterRef('pk'), lesson__is_active=True
+        ).order_by().values('enrollment_id').annotate(total=Count('pk')).values('total')
+    )
+    # Integer division truncates like int() in update_progress
+    progress = Coalesce(completed, 0) * 100 / Value(total_lessons)
+    return enrollments.update(
+        progress=progress,
+        is_completed=GreaterThanOrEqual(progress, 100),
+        updated_at=timezone.now(),
+    )
+
+
+def claim_next_job():
+    """Marks the oldest pending job as running and returns it, or None"""
+    for job in ProgressRecomputeJob.objects.filter(status='pending').order_by('created_at')[:10]:
+        claimed = ProgressRecomputeJob.objects.filter(pk=job.pk, status='pending').update(
+            status='running', started_at=timezone.now()
+        )
+        # Another worker may have taken it first
+        if claimed:
+            job.refresh_from_db()
+            return job
+    return None
+
+
+def run_job(job):
+    try:
+        with transaction.atomic():
+            if job.rebuild_bitmaps:
+                Enrollment.rebuild_completion_bitmaps(job.course_id)
+            job.enrollments_updated = recompute_course_progress(job.course_id)
+        job.status = 'done'
+    except Exception as e:
+        logger.exception("Progress recompute for course %s failed", job.course_id)
+        job.status = 'failed'
+        job.error = str(e)
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'enrollments_updated', 'error', 'finished_at'])
+    return job
+
+
+def run_pending_jobs():
+    """Runs queued jobs until none are left; returns how many ran"""
+    count = 0
+    while (job := claim_next_job()) is not None:
+        run_job(job)
+        count += 1
+    return count
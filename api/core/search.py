@@ -0,0 +1,124 @@
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.utils.module_loading import import_string
+
+from .models import Course
+
+
+class IContainsSearchBackend:
+    """Fallback backend that scans the course table with LIKE queries."""
+
+    def search(self, queryset, query):
+        return queryset.filter(
+            Q(title__icontains=query) |
+            Q(description__icontains=query) |
+            Q(category__title__icontains=query)
+        ).order_by('-created_at')
+
+    def index_course(self, course):
+        pass
+
+    def remove_course(self, course_id):
+        pass
+
+    def index_category(self, category):
+        pass
+
+    def rebuild(self):
+        return 0
+
+
+class SQLiteFTS5SearchBackend:
+    """
+    Ranked search backed by the ``core_course_fts`` FTS5 table.
+
+    The table is created by migration 0010 and kept in sync by the
+    Course/Category signal handlers in ``signals.py``.
+    """
+    table = 'core_course_fts'
+
+    def build_match_expression(self, query):
+        terms = re.findall(r'\w+', query)
+        if not terms:
+            return None
+        # Quote every term so user input can't inject FTS syntax and treat
+        # the last one as a prefix, since the search box queries per keystroke.
+        quoted = ['"%s"' % term for term in terms]
+        quoted[-1] += '*'
+        return ' '.join(quoted)
+
+    def search(self, queryset, query):
+        match = self.build_match_expression(query)
+        if match is None:
+            return queryset.none()
+
+        return queryset.extra(
+            select={'search_rank': f'{self.table}.rank'},
+            tables=[self.table],
+            where=[
+                f'{self.table}.rowid = {Course._meta.db_table}.id',
+                f'{self.table} MATCH %s',
+            ],
+            params=[match],
+            order_by=['search_rank', '-created_at'],
+        )
+
+    def _document(self, course):
+        learn = course.what_you_will_learn or []
+        if not isinstance(learn, list):
+            learn = [learn]
+        return [
+            course.title,
+            course.description,
+            '\n'.join(str(item) for item in learn),
+            course.category.title,
+        ]
+
+    def index_course(self, course):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table} WHERE rowid = %s', [course.pk])
+            cursor.execute(
+                f'INSERT INTO {self.table} (rowid, title, description, what_you_will_learn, category) '
+                'VALUES (%s, %s, %s, %s, %s)',
+                [course.pk, *self._document(course)]
+            )
+
+    def remove_course(self, course_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table} WHERE rowid = %s', [course_id])
+
+    def index_category(self, category):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'UPDATE {self.table} SET category = %s WHERE rowid IN '
+                f'(SELECT id FROM {Course._meta.db_table} WHERE category_id = %s)',
+                [category.title, category.pk]
+            )
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table}')
+        count = 0
+        for course in Course.objects.select_related('category').iterator():
+            self.index_course(course)
+            count += 1
+        return count
+
+
+def get_search_backend():
+    """
+    Returns the configured course search backend.
+
+    ``COURSE_SEARCH_BACKEND`` may point at any class implementing the
+    interface above; when unset, FTS5 is used on SQLite and plain
+    ``icontains`` filtering everywhere else.
+    """
+    path = getattr(settings, 'COURSE_SEARCH_BACKEND', None)
+    if path:
+        return import_string(path)()
+    if connection.vendor == 'sqlite':
+        return SQLiteFTS5SearchBackend()
+    return IContainsSearchBackend()
@@ -1,7 +1,8 @@
 from rest_framework import serializers
 from ast import literal_eval  
 from .models import (
-    Category, Course, Lesson, Material, Enrollment, QuestionAnswer, CurriculumSection
+    Category, Course, Lesson, Material, Enrollment, QuestionAnswer, CurriculumSection,
+    ProgressRecomputeJob
 )
 from api.accounts.models import User
 
@@ -56,6 +57,8 @@ class CourseSerializer(serializers.ModelSerializer):
             'requirements', 'curriculum',
             'created_at', 'updated_at'
         ]
+        # Counters maintained by enrollments and reviews
+        read_only_fields = ['rating', 'reviews', 'students']
         extra_kwargs = {
             'banner': {'required': True},
             'price': {'min_value': 0},
@@ -87,6 +90,22 @@ class CourseSerializer(serializers.ModelSerializer):
         return [str(item).strip() for item in value if str(item).strip()]
 
 
+class CourseListSerializer(serializers.ModelSerializer):
+    """Catalog card representation: no curriculum, lessons or long-form content"""
+    category = CategorySerializer(read_only=True)
+    instructor = InstructorSerializer(read_only=True)
+
+    class Meta:
+        model = Course
+        fields = [
+            'id', 'title', 'description', 'banner', 'price',
+            'discount_price', 'duration', 'rating', 'reviews',
+            'students', 'start_date', 'is_featured', 'level',
+            'category', 'instructor', 'created_at', 'updated_at'
+        ]
+        read_only_fields = fields
+
+
 class MaterialSerializer(serializers.ModelSerializer):
     class Meta:
         model = Material
@@ -104,7 +123,51 @@ class EnrollmentSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Enrollment
-        fields = '__all__'
+        # The bitmap is an internal copy of completed_lessons
+        exclude = ['completion_bitmap']
+
+
+class EnrollmentCourseSerializer(serializers.ModelSerializer):
+    instructor_name = serializers.CharField(source='instructor.full_name', read_only=True)
+
+    class Meta:
+        model = Course
+        fields = ['id', 'title', 'banner', 'instructor_name']
+
+
+class EnrollmentCardSerializer(serializers.ModelSerializer):
+    """Compact enrollment for dashboards; EnrollmentSerializer is the full form"""
+    course = EnrollmentCourseSerializer(read_only=True)
+    last_activity = serializers.DateTimeField(read_only=True)
+
+    class Meta:
+        model = Enrollment
+        fields = ['id', 'course', 'progress', 'is_completed', 'created_at', 'last_activity']
+
+
+class LessonCompletionBatchSerializer(serializers.Serializer):
+    completed = serializers.ListField(
+        child=serializers.IntegerField(), required=False, default=list, max_length=500
+    )
+    incomplete = serializers.ListField(
+        child=serializers.IntegerField(), required=False, default=list, max_length=500
+    )
+
+    def validate(self, data):
+        if not data['completed'] and not data['incomplete']:
+            raise serializers.ValidationError("Provide lesson IDs in 'completed' or 'incomplete'.")
+        if set(data['completed']) & set(data['incomplete']):
+            raise serializers.ValidationError("A lesson cannot be both completed and incomplete.")
+        return data
+
+
+class ProgressRecomputeJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ProgressRecomputeJob
+        fields = [
+            'id', 'course', 'status', 'enrollments_updated', 'error',
+            'created_at', 'started_at', 'finished_at'
+        ]
 
 
 class PaymentSerializer(serializers.Serializer):
@@ -0,0 +1,198 @@
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_delete
+from django.dispatch import receiver
+
+from api.accounts.models import User
+from .caching import bump_course_version, enrolled_courses_cache_key
+from .models import Category, Course, CurriculumSection, Enrollment, Lesson
+from .progress import schedule_progress_recompute
+from .search import get_search_backend
+from .snapshot import (
+    ALL_PAGES,
+    CATEGORIES,
+    COURSES,
+    category_pages_for,
+    course_pages_for,
+    schedule_rebuild,
+    snapshot_exists,
+)
+
+# User fields that never appear in a course payload; saves touching only
+# these (logins, OTP refreshes) don't invalidate the instructor's courses.
+INSTRUCTOR_PRIVATE_FIELDS = {'last_login', 'password', 'otp', 'otp_created_at', 'is_verified'}
+
+
+@receiver(post_save, sender=Course)
+def index_course(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    get_search_backend().index_course(instance)
+
+
+@receiver(post_delete, sender=Course)
+def unindex_course(sender, instance, **kwargs):
+    get_search_backend().remove_course(instance.pk)
+
+
+@receiver(post_save, sender=Category)
+def index_category(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    get_search_backend().index_category(instance)
+
+
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+def invalidate_course(sender, instance, **kwargs):
+    bump_course_version(instance.pk)
+
+
+@receiver(post_save, sender=CurriculumSection)
+@receiver(post_delete, sender=CurriculumSection)
+@receiver(post_save, sender=Lesson)
+@receiver(post_delete, sender=Lesson)
+def invalidate_course_content(sender, instance, **kwargs):
+    bump_course_version(instance.course_id)
+
+
+@receiver(post_delete, sender=Lesson)
+def remove_lesson_from_course_totals(sender, instance, **kwargs):
+    # Covers cascades from sections and courses, which skip Lesson.delete()
+    stored = instance.stored_course_totals() or instance.course_totals()
+    course_id, lessons, seconds = stored
+    Course.adjust_lesson_totals(course_id, -lessons, -seconds)
+
+
+def schedule_course_progress(course_ids, rebuild_bitmaps=False):
+    # After commit, when courses deleted by the same cascade are gone
+    def schedule():
+        existing = Course.objects.filter(pk__in=course_ids).values_list('pk', flat=True)
+        schedule_progress_recompute(*existing, rebuild_bitmaps=rebuild_bitmaps)
+    transaction.on_commit(schedule)
+
+
+@receiver(post_save, sender=Lesson)
+def recompute_progress_after_lesson_save(sender, instance, raw=False, **kwargs):
+    # Progress only depends on how many active lessons each course has
+    if raw:
+        return
+    previous = getattr(instance, '_previous_totals', None)
+    before = previous[:2] if previous else None
+    after = instance.course_totals()[:2]
+    if before != after:
+        schedule_course_progress({
+            course_id for course_id, lessons in filter(None, (before, after)) if lessons
+        })
+
+
+@receiver(post_delete, sender=Lesson)
+def recompute_progress_after_lesson_delete(sender, instance, **kwargs):
+    # Also clears the lesson's bits; its slot is never handed out again anyway
+    stored = instance.stored_course_totals() or instance.course_totals()
+    schedule_course_progress({stored[0]}, rebuild_bitmaps=True)
+
+
+@receiver(post_save, sender=Enrollment)
+def invalidate_enrolled_courses_on_save(sender, instance, created=False, **kwargs):
+    # Only new rows and activation changes alter the set; progress writes don't.
+    # save() still holds the previous state in _stored_is_active here.
+    if created or getattr(instance, '_stored_is_active', None) != instance.is_active:
+        invalidate_enrolled_courses(instance)
+
+
+def deleted_courses(origin):
+    """Courses removed by one delete() call, kept on the object it was called on"""
+    courses = getattr(origin, '_deleted_courses', None)
+    if courses is None:
+        courses = set()
+        if origin is not None:
+            origin._deleted_courses = courses
+    return courses
+
+
+@receiver(pre_delete, sender=Course)
+def note_deleted_course(sender, instance, origin=None, **kwargs):
+    # Every pre_delete of a call is sent before its first post_delete
+    deleted_courses(origin).add(instance.pk)
+
+
+@receiver(post_delete, sender=Enrollment)
+def remove_enrollment_from_students_count(sender, instance, origin=None, **kwargs):
+    # Covers queryset deletes and cascades from users and courses, which skip
+    # Enrollment.delete(); counts of courses deleted alongside don't matter
+    if instance.course_id in deleted_courses(origin):
+        return
+    if getattr(instance, '_stored_is_active', instance.is_active):
+        instance._adjust_students_count(-1)
+
+
+@receiver(post_delete, sender=Enrollment)
+def invalidate_enrolled_courses_on_delete(sender, instance, **kwargs):
+    invalidate_enrolled_courses(instance)
+
+
+def invalidate_enrolled_courses(instance):
+    key = enrolled_courses_cache_key(instance.user_id)
+    cache.delete(key)
+    # Again after commit, in case a concurrent read cached the old set meanwhile
+    transaction.on_commit(lambda: cache.delete(key))
+
+
+@receiver(post_save, sender=Category)
+def invalidate_category_courses(sender, instance, **kwargs):
+    bump_course_version(*Course.objects.filter(category=instance).values_list('pk', flat=True))
+
+
+def is_public_instructor_change(instance, update_fields):
+    if instance.role != 'teacher':
+        return False
+    return not (update_fields and set(update_fields) <= INSTRUCTOR_PRIVATE_FIELDS)
+
+
+@receiver(post_save, sender=User)
+def invalidate_instructor_courses(sender, instance, update_fields=None, **kwargs):
+    if not is_public_instructor_change(instance, update_fields):
+        return
+    bump_course_version(*Course.objects.filter(instructor=instance).values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Course)
+def refresh_course_snapshot(sender, instance, created, raw=False, **kwargs):
+    if raw or not snapshot_exists():
+        return
+    if created:
+        # Every later course shifts down a slot and the count changes
+        schedule_rebuild(COURSES, ALL_PAGES)
+    else:
+        schedule_rebuild(COURSES, course_pages_for(Course.objects.filter(pk=instance.pk)))
+
+
+@receiver(post_delete, sender=Course)
+def refresh_snapshot_after_course_delete(sender, instance, **kwargs):
+    if snapshot_exists():
+        schedule_rebuild(COURSES, ALL_PAGES)
+
+
+@receiver(post_save, sender=Category)
+def refresh_category_snapshot(sender, instance, created, raw=False, **kwargs):
+    if raw or not snapshot_exists():
+        return
+    if created:
+        schedule_rebuild(CATEGORIES, ALL_PAGES)
+    else:
+        schedule_rebuild(CATEGORIES, category_pages_for(instance))
+        schedule_rebuild(COURSES, course_pages_for(Course.objects.filter(category=instance)))
+
+
+@receiver(post_delete, sender=Category)
+def refresh_snapshot_after_category_delete(sender, instance, **kwargs):
+    if snapshot_exists():
+        schedule_rebuild(CATEGORIES, ALL_PAGES)
+
+
+@receiver(post_save, sender=User)
+def refresh_instructor_snapshot(sender, instance, update_fields=None, **kwargs):
+    if not snapshot_exists() or not is_public_instructor_change(instance, update_fields):
+        return
+    schedule_rebuild(COURSES, course_pages_for(Course.objects.filter(instructor=instance)))
@@ -0,0 +1,322 @@
+"""
+Precomputed, precompressed JSON snapshots of the anonymous catalog pages.
+
+``build_catalog_snapshot`` writes the first ``CATALOG_SNAPSHOT_PAGES`` pages
+of ``course_list`` and ``category_list`` under ``CATALOG_SNAPSHOT_DIR``
+(inside ``STATIC_ROOT``), each as a content-hashed ``.json`` file with
+``.gz`` and, when the optional ``brotli`` package is installed, ``.br``
+siblings. ``manifest.json`` maps every page to its current file. Once a
+snapshot exists, the Course/Category signal handlers queue the affected
+pages as ``SnapshotRebuild`` rows and the ``run_snapshot_rebuilds`` worker
+rewrites them, so requests never render pages themselves. Counter changes
+(students, ratings) queue the course and the worker looks up its page.
+Anonymous default-filter requests are answered straight from disk.
+"""
+import gzip
+import hashlib
+import json
+import os
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Q
+from django.http import FileResponse
+from django.urls import reverse
+
+from .models import Category, Course, SnapshotRebuild
+from .serializers import CategorySerializer, CourseListSerializer
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock, run a single writer
+    fcntl = None
+
+PAGE_SIZE = 16
+ALL_PAGES = 'all'
+
+COURSES = 'courses'
+CATEGORIES = 'categories'
+
+
+def snapshot_dir():
+    return settings.CATALOG_SNAPSHOT_DIR
+
+
+def snapshot_pages():
+    return settings.CATALOG_SNAPSHOT_PAGES
+
+
+def _manifest_path():
+    return os.path.join(snapshot_dir(), 'manifest.json')
+
+
+def _write_atomic(path, content):
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+@contextmanager
+def _writer_lock():
+    """Serializes snapshot writers across processes"""
+    os.makedirs(snapshot_dir(), exist_ok=True)
+    with open(os.path.join(snapshot_dir(), '.lock'), 'w') as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        yield
+
+
+_manifest_cache = {'mtime': None, 'data': None}
+
+
+def load_manifest():
+    """Returns the current manifest, re-reading it only when the file changes"""
+    try:
+        mtime = os.stat(_manifest_path()).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    if _manifest_cache['mtime'] != mtime:
+        with open(_manifest_path()) as f:
+            _manifest_cache['data'] = json.load(f)
+        _manifest_cache['mtime'] = mtime
+    return _manifest_cache['data']
+
+
+def snapshot_exists():
+    return os.path.exists(_manifest_path())
+
+
+def _ordered_courses():
+    return Course.objects.select_related('category', 'instructor').order_by('-created_at', '-id')
+
+
+def _ordered_categories():
+    return Category.objects.order_by('created_at', 'id')
+
+
+def _page_link(url_name, number):
+    url = reverse(url_name)
+    return url if number == 1 else f'{url}?page={number}'
+
+
+def _build_page(kind, paginator, number):
+    page = paginator.page(number)
+    if kind == COURSES:
+        url_name = 'course-list'
+        results = CourseListSerializer(page.object_list, many=True).data
+    else:
+        url_name = 'category-list'
+        results = CategorySerializer(page.object_list, many=True).data
+
+    # Same shape as MyPagination, with site-relative links
+    return {
+        'count': paginator.count,
+        'next': _page_link(url_name, number + 1) if page.has_next() else None,
+        'previous': _page_link(url_name, number - 1) if page.has_previous() else None,
+        'results': results,
+        'total_pages': paginator.num_pages,
+        'current_page': number,
+    }
+
+
+def _write_page(kind, number, payload):
+    content = json.dumps(payload, cls=DjangoJSONEncoder, separators=(',', ':')).encode()
+    digest = hashlib.md5(content).hexdigest()[:12]
+    relative = f'{kind}/page-{number}.{digest}.json'
+    path = os.path.join(snapshot_dir(), relative)
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if not os.path.exists(path):
+        _write_atomic(f'{path}.gz', gzip.compress(content, compresslevel=9))
+        if brotli is not None:
+            _write_atomic(f'{path}.br', brotli.compress(content))
+        _write_atomic(path, content)
+    return relative
+
+
+def _remove_file(relative):
+    path = os.path.join(snapshot_dir(), relative)
+    for suffix in ('', '.gz', '.br'):
+        try:
+            os.remove(path + suffix)
+        except FileNotFoundError:
+            pass
+
+
+def rebuild_pages(pages_by_kind):
+    """
+    Rewrites the given pages and publishes them through the manifest.
+
+    ``pages_by_kind`` maps ``COURSES``/``CATEGORIES`` to a set of page
+    numbers, or to ``ALL_PAGES``. Pages past the end of the listing or
+    past ``CATALOG_SNAPSHOT_PAGES`` are dropped from the snapshot.
+
+    Writers hold a file lock from reading the listings to publishing the
+    manifest, so concurrent rebuilds neither drop each other's manifest
+    entries nor publish pages older than the ones already there.
+    """
+    with _writer_lock():
+        return _rebuild_pages(pages_by_kind)
+
+
+def _rebuild_pages(pages_by_kind):
+    try:
+        with open(_manifest_path()) as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        manifest = {}
+    stale = []
+
+    for kind, pages in pages_by_kind.items():
+        queryset = _ordered_courses() if kind == COURSES else _ordered_categories()
+        paginator = Paginator(queryset, PAGE_SIZE)
+        last_page = min(paginator.num_pages, snapshot_pages())
+        entries = dict(manifest.get(kind, {}))
+
+        if pages == ALL_PAGES:
+            pages = range(1, snapshot_pages() + 1)
+        for number in pages:
+            old = entries.pop(str(number), None)
+            if number <= last_page:
+                entries[str(number)] = _write_page(kind, number, _build_page(kind, paginator, number))
+            if old and old != entries.get(str(number)):
+                stale.append(old)
+        manifest[kind] = entries
+
+    os.makedirs(snapshot_dir(), exist_ok=True)
+    _write_atomic(_manifest_path(), json.dumps(manifest, indent=2).encode())
+    for relative in stale:
+        _remove_file(relative)
+    return manifest
+
+
+def build_snapshot():
+    return rebuild_pages({COURSES: ALL_PAGES, CATEGORIES: ALL_PAGES})
+
+
+def course_pages_for(queryset):
+    """Snapshot pages of the course listing that contain any course in ``queryset``"""
+    ids = set(queryset.values_list('pk', flat=True))
+    window = _ordered_courses().values_list('pk', flat=True)[:snapshot_pages() * PAGE_SIZE]
+    return {index // PAGE_SIZE + 1 for index, pk in enumerate(window) if pk in ids}
+
+
+def category_pages_for(category):
+    position = _ordered_categories().filter(
+        Q(created_at__lt=category.created_at) |
+        Q(created_at=category.created_at, id__lt=category.pk)
+    ).count()
+    return {position // PAGE_SIZE + 1}
+
+
+def _queue(kind, pages=(), course_id=None):
+    """
+    Adds the rows not already waiting unclaimed. Runs after the change
+    commits: a row skipped here is either still unclaimed or claimed by a
+    worker that reads the listings after this change was committed.
+    """
+    def queue():
+        pending = SnapshotRebuild.objects.filter(kind=kind, claimed=False)
+        if course_id is not None:
+            if not pending.filter(course_id=course_id).exists():
+                SnapshotRebuild.objects.create(kind=kind, course_id=course_id)
+            return
+        waiting = set(pending.filter(page__in=pages).values_list('page', flat=True))
+        SnapshotRebuild.objects.bulk_create([
+            SnapshotRebuild(kind=kind, page=page) for page in pages if page not in waiting
+        ])
+    transaction.on_commit(queue)
+
+
+def schedule_rebuild(kind, pages):
+    """Queues pages for the ``run_snapshot_rebuilds`` worker once the current transaction commits"""
+    if snapshot_exists():
+        _queue(kind, pages=[0] if pages == ALL_PAGES else sorted(pages))
+
+
+def schedule_course_rebuild(course_id):
+    """Queues the page showing a course, leaving the page lookup to the worker"""
+    if snapshot_exists():
+        _queue(COURSES, course_id=course_id)
+
+
+def run_pending_rebuilds():
+    """Rewrites every queued page once; returns how many queued rows were handled"""
+    ids = list(SnapshotRebuild.objects.values_list('pk', flat=True))
+    if not ids:
+        return 0
+    # Changes committed from here on queue new rows instead of relying on these
+    SnapshotRebuild.objects.filter(pk__in=ids).update(claimed=True)
+    queued = list(SnapshotRebuild.objects.filter(pk__in=ids).values_list('kind', 'page', 'course_id'))
+
+    pages_by_kind = {}
+    course_ids = set()
+    for kind, page, course_id in queued:
+        if course_id is not None:
+            course_ids.add(course_id)
+        elif page == 0 or pages_by_kind.get(kind) == ALL_PAGES:
+            pages_by_kind[kind] = ALL_PAGES
+        else:
+            pages_by_kind.setdefault(kind, set()).add(page)
+    if course_ids and pages_by_kind.get(COURSES) != ALL_PAGES:
+        pages = course_pages_for(Course.objects.filter(pk__in=course_ids))
+        pages_by_kind.setdefault(COURSES, set()).update(pages)
+    rebuild_pages(pages_by_kind)
+
+    SnapshotRebuild.objects.filter(pk__in=ids).delete()
+    return len(ids)
+
+
+def _snapshot_file(request, kind):
+    if request.method != 'GET' or request.user.is_authenticated:
+        return None
+    if set(request.query_params) - {'page'}:
+        return None
+
+    page = request.query_params.get('page', '1')
+    manifest = load_manifest()
+    if not manifest:
+        return None
+    return manifest.get(kind, {}).get(page)
+
+
+def snapshot_view(kind):
+    """
+    Answers anonymous, unfiltered requests for the first pages of a
+    listing from the precompressed snapshot. Apply it below ``@api_view``.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def inner(request, *args, **kwargs):
+            relative = _snapshot_file(request, kind)
+            if relative is None:
+                return view_func(request, *args, **kwargs)
+
+            path = os.path.join(snapshot_dir(), relative)
+            accepted = request.META.get('HTTP_ACCEPT_ENCODING', '')
+            encoding = None
+            for name, suffix in (('br', '.br'), ('gzip', '.gz')):
+                if name in accepted and os.path.exists(path + suffix):
+                    path, encoding = path + suffix, name
+                    break
+
+            try:
+                response = FileResponse(open(path, 'rb'), content_type='application/json')
+            except FileNotFoundError:
+                return view_func(request, *args, **kwargs)
+            if encoding:
+                response.headers['Content-Encoding'] = encoding
+            response.headers['Vary'] = 'Accept-Encoding'
+            return response
+        return inner
+    return decorator
@@ -0,0 +1,36 @@
+"""Fixtures shared by the app test suites"""
+from django.test import TestCase, override_settings
+
+from api.accounts.models import User
+from .models import Category, Course
+
+
+def create_user(username, role='student', **extra):
+    return User.objects.create_user(
+        username=username, email=f'{username}@example.com', password='pass', role=role, **extra
+    )
+
+
+def create_course(instructor, category, title='Python'):
+    return Course.objects.create(
+        title=title, description='Description', banner='https://example.com/b.png',
+        price=10, duration='1h', category=category, instructor=instructor
+    )
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    CACHE_SINGLE_PROCESS=True,
+)
+class CacheTestCase(TestCase):
+    """Runs on a process-local cache instead of the configured shared one, whatever the runner"""
+
+
+class CourseTestCase(CacheTestCase):
+    """Starts every test with ``teacher``, a ``category`` and the teacher's ``course``"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = create_user('teacher', role='teacher')
+        cls.category = Category.objects.create(title='Programming')
+        cls.course = create_course(cls.teacher, cls.category)
@@ -1,3 +1,1070 @@
-from django.test import TestCase
+import base64
+import gzip
+import json
+import os
+import tempfile
+from io import StringIO
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.http import FileResponse, QueryDict
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from api.reviews.models import Review
+from . import completion_queue, snapshot
+from .caching import check_shared_cache
+from .models import (
+    Category, Course, CurriculumSection, Enrollment, Lesson, ProgressRecomputeJob,
+    SnapshotRebuild,
+)
+from .progress import recompute_course_progress, run_pending_jobs
+from .serializers import EnrollmentSerializer
+from .testing import CacheTestCase, CourseTestCase, create_course, create_user
+from .views import MAX_BATCH_COURSES, filter_courses
+
+
+class CourseListQueryCountTests(CacheTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(title='Programming')
+        for index in range(20):
+            instructor = create_user(f'teacher{index}', role='teacher')
+            course = create_course(instructor, category, title=f'Course {index}')
+            section = CurriculumSection.objects.create(course=course, title='Intro')
+            for number in range(3):
+                Lesson.objects.create(
+                    course=course, section=section, title=f'Lesson {number}', video='v'
+                )
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_card_page_runs_constant_queries(self):
+        # ETag aggregate + COUNT + one SELECT joining category and instructor
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/courses/')
+        self.assertEqual(len(response.data['results']), 16)
+        self.assertNotIn('curriculum', response.data['results'][0])
+
+    def test_expanded_page_prefetches_curriculum(self):
+        # ETag aggregate + COUNT + courses + sections + lessons
+        with self.assertNumQueries(5):
+            response = self.client.get('/api/courses/', {'expand': 'curriculum'})
+        lectures = response.data['results'][0]['curriculum'][0]['lectures']
+        self.assertEqual(len(lectures), 3)
+
+
+class ConditionalGetTests(CourseTestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def assertRevalidates(self, url, change):
+        response = self.client.get(url)
+        etag = response.headers['ETag']
+        self.assertNotIn('Last-Modified', response.headers)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            change()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+
+    def test_course_detail_follows_counter_updates(self):
+        self.assertRevalidates(
+            f'/api/courses/{self.course.pk}/',
+            lambda: Course.adjust_students_count(self.course.pk, 1),
+        )
+
+    def test_course_list_follows_deletes(self):
+        other = create_course(self.teacher, self.category, title='Django')
+        # Any query parameter bypasses the anonymous snapshot
+        self.assertRevalidates('/api/courses/?ordering=newest', other.delete)
+
+    def test_if_modified_since_alone_is_not_trusted(self):
+        self.client.force_authenticate(self.teacher)
+        response = self.client.get(
+            '/api/categories/', HTTP_IF_MODIFIED_SINCE='Fri, 01 Jan 2100 00:00:00 GMT'
+        )
+        self.assertEqual(response.status_code, 200)
+
+
+class CourseDetailCacheTests(CourseTestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.url = f'/api/courses/{self.course.pk}/'
+
+    def detail(self):
+        return self.client.get(self.url).data
+
+    def test_payload_is_cached(self):
+        self.detail()
+        # Only the ETag aggregate runs; the payload comes from the cache
+        with self.assertNumQueries(1):
+            self.detail()
+
+    def test_course_changes_invalidate(self):
+        self.detail()
+        self.course.title = 'Advanced Python'
+        self.course.save()
+        self.assertEqual(self.detail()['title'], 'Advanced Python')
+
+    def test_lesson_changes_invalidate(self):
+        section = CurriculumSection.objects.create(course=self.course, title='Intro')
+        self.assertEqual(self.detail()['curriculum'][0]['lectures'], [])
+        Lesson.objects.create(course=self.course, section=section, title='First', video='v')
+        self.assertEqual(len(self.detail()['curriculum'][0]['lectures']), 1)
+
+    def test_review_changes_invalidate(self):
+        self.detail()
+        with self.captureOnCommitCallbacks(execute=True):
+            Review.objects.create(course=self.course, user=create_user('student'), rating=4, comment='Good')
+        data = self.detail()
+        self.assertEqual((data['rating'], data['reviews']), (4.0, 1))
+
+    def test_runs_on_a_process_local_cache(self):
+        self.assertIsInstance(caches['default'], LocMemCache)
+
+    @override_settings(
+        CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+        CACHE_SINGLE_PROCESS=False,
+    )
+    def test_process_local_cache_needs_single_process_opt_in(self):
+        self.assertEqual([error.id for error in check_shared_cache(None)], ['core.E001'])
+
+
+class CourseBatchTests(CourseTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.other = create_course(cls.teacher, cls.category, title='Django')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def batch(self, ids):
+        return self.client.get('/api/courses/batch/', {'ids': ids})
+
+    def test_rejects_malformed_missing_and_oversized_id_lists(self):
+        for ids in ['1,abc', '1.5', '', ' , ', ','.join(str(pk) for pk in range(1, MAX_BATCH_COURSES + 2))]:
+            with self.subTest(ids=ids[:20]):
+                response = self.batch(ids)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('ids', response.data)
+
+    def test_keeps_request_order_and_drops_duplicates(self):
+        response = self.batch(f'{self.other.pk}, {self.course.pk},{self.other.pk}')
+        self.assertEqual([course['id'] for course in response.data['results']], [self.other.pk, self.course.pk])
+        self.assertEqual(response.data['missing'], [])
+
+    def test_reports_unknown_ids_as_missing(self):
+        response = self.batch(f'999,{self.course.pk}')
+        self.assertEqual([course['id'] for course in response.data['results']], [self.course.pk])
+        self.assertEqual(response.data['missing'], [999])
+
+    def test_warm_entries_come_from_the_detail_cache(self):
+        ids = f'{self.course.pk},{self.other.pk}'
+        self.batch(ids)
+        with self.assertNumQueries(0):
+            response = self.batch(ids)
+        self.assertEqual(len(response.data['results']), 2)
+
+
+class CourseFacetsTests(CourseTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        design = Category.objects.create(title='Design')
+        for title, category, level, price, is_featured in [
+            ('Free', design, 'Beginner', 0, False),
+            ('Mid', design, 'Advanced', 35, True),
+            ('Premium', cls.category, 'Advanced', 150, True),
+        ]:
+            course = create_course(cls.teacher, category, title=title)
+            course.level, course.price, course.is_featured = level, price, is_featured
+            course.save()
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def facets(self, **params):
+        return self.client.get('/api/courses/facets/', params)
+
+    def test_counts_every_facet(self):
+        data = self.facets().data
+        self.assertEqual(data['count'], 4)
+        self.assertEqual(
+            [(category['name'], category['count']) for category in data['categories']],
+            [('Design', 2), ('Programming', 2)]
+        )
+        self.assertEqual(
+            data['levels'],
+            [{'value': 'Beginner', 'count': 2}, {'value': 'Intermediate', 'count': 0},
+             {'value': 'Advanced', 'count': 2}]
+        )
+        self.assertEqual(data['is_featured'], {'true': 2, 'false': 2})
+        self.assertEqual(
+            {band['value']: band['count'] for band in data['price_bands']},
+            {'free': 1, 'under_20': 1, '20_to_50': 1, '50_to_100': 0, 'over_100': 1}
+        )
+
+    def test_counts_follow_the_filters(self):
+        data = self.facets(level='Advanced', is_featured='true').data
+        self.assertEqual(data['count'], 2)
+        self.assertEqual({band['value']: band['count'] for band in data['price_bands']}['over_100'], 1)
+
+    def test_cached_counts_follow_course_changes(self):
+        self.assertEqual(self.facets(level='Intermediate').data['count'], 0)
+        with self.assertNumQueries(0):
+            self.facets(level='Intermediate')
+
+        self.course.level = 'Intermediate'
+        self.course.save()
+        self.assertEqual(self.facets(level='Intermediate').data['count'], 1)
+
+    def test_rejects_malformed_filters(self):
+        self.assertEqual(self.facets(category='abc').status_code, 400)
+
+
+class CourseSearchTests(CourseTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.web = create_course(cls.teacher, cls.category, title='Web development')
+        cls.web.description = 'Build sites, with a little Python on the server'
+        cls.web.save()
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def search(self, query):
+        response = self.client.get('/api/courses/', {'search': query})
+        self.assertEqual(response.status_code, 200)
+        return [course['title'] for course in response.data['results']]
+
+    def test_ranks_title_matches_first(self):
+        self.assertEqual(self.search('python'), ['Python', 'Web development'])
+
+    def test_last_term_matches_as_a_prefix(self):
+        self.assertEqual(self.search('web devel'), ['Web development'])
+        self.assertEqual(self.search('devel web'), [])
+
+    def test_user_input_cannot_inject_match_syntax(self):
+        self.assertEqual(self.search('" OR ('), [])
+        self.assertEqual(self.search('python" NOT web'), [])
+        self.assertEqual(self.search('web*'), ['Web development'])
+
+    def test_index_follows_course_and_category_changes(self):
+        self.course.title = 'Rust'
+        self.course.save()
+        self.assertEqual(self.search('rust'), ['Rust'])
+        self.assertEqual(self.search('python'), ['Web development'])
+
+        self.category.title = 'Systems'
+        self.category.save()
+        self.assertCountEqual(self.search('systems'), ['Rust', 'Web development'])
+
+        self.web.delete()
+        self.assertEqual(self.search('python'), [])
+
+    def test_rebuild_command_reindexes_every_course(self):
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM core_course_fts')
+        self.assertEqual(self.search('python'), [])
+        out = StringIO()
+        call_command('rebuild_search_index', stdout=out)
+        self.assertIn('Indexed 2 courses', out.getvalue())
+        self.assertEqual(self.search('python'), ['Python', 'Web development'])
+
+
+class CourseOrderingTests(CacheTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        teacher = create_user('teacher', role='teacher')
+        category = Category.objects.create(title='Programming')
+        cls.courses = {}
+        for title, price, discount_price, rating, students in [
+            ('A', 30, None, 4.5, 10),
+            ('B', 50, 20, 3.0, 40),
+            ('C', 10, None, 4.5, 25),
+            ('D', 25, None, 5.0, 10),
+            # A zero discount makes the course free
+            ('E', 40, 0, 1.0, 0),
+        ]:
+            course = create_course(teacher, category, title=title)
+            course.price, course.discount_price = price, discount_price
+            course.save()
+            Course.objects.filter(pk=course.pk).update(rating=rating, students=students)
+            cls.courses[title] = course
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def titles(self, **params):
+        response = self.client.get('/api/courses/', params)
+        self.assertEqual(response.status_code, 200)
+        return [course['title'] for course in response.data['results']]
+
+    def test_orderings(self):
+        for ordering, expected in [
+            ('newest', ['E', 'D', 'C', 'B', 'A']),
+            # The discounted price counts
+            ('price', ['E', 'C', 'B', 'D', 'A']),
+            ('-price', ['A', 'D', 'B', 'C', 'E']),
+            # Ties go to the newer course
+            ('rating', ['D', 'C', 'A', 'B', 'E']),
+            ('students', ['B', 'C', 'D', 'A', 'E']),
+        ]:
+            with self.subTest(ordering=ordering):
+                self.assertEqual(self.titles(ordering=ordering), expected)
+
+    def test_ordering_overrides_search_relevance(self):
+        self.assertEqual(self.titles(search='description', ordering='price'), ['E', 'C', 'B', 'D', 'A'])
+
+    def test_rejects_unknown_orderings(self):
+        response = self.client.get('/api/courses/', {'ordering': 'title'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('ordering', response.data)
+
+
+def cursor(ordering, position):
+    data = json.dumps({'ordering': ordering, 'position': position})
+    return base64.urlsafe_b64encode(data.encode()).decode()
+
+
+class KeysetPaginationTests(CacheTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        teacher = create_user('teacher', role='teacher')
+        for index in range(5):
+            category = Category.objects.create(title=f'Category {index}')
+            create_course(teacher, category, title=f'Course {index}')
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def follow(self, url, params):
+        ids = []
+        response = self.client.get(url, {**params, 'cursor': ''})
+        while True:
+            ids += [row['id'] for row in response.data['results']]
+            if not response.data['next']:
+                return ids
+            response = self.client.get(response.data['next'])
+
+    def test_pages_through_every_row_once(self):
+        self.assertEqual(
+            self.follow('/api/categories/', {'limit': 2}),
+            list(Category.objects.order_by('created_at', 'id').values_list('pk', flat=True))
+        )
+        self.assertEqual(
+            self.follow('/api/courses/', {'limit': 2, 'ordering': 'price'}),
+            list(Course.objects.order_by('effective_price', 'id').values_list('pk', flat=True))
+        )
+
+    def test_rejects_malformed_cursors(self):
+        newest = ['-created_at', '-id']
+        for url, bad in [
+            ('/api/categories/', 'not base64 json'),
+            ('/api/categories/', cursor(['created_at', 'id'], ['yesterday', 1])),
+            ('/api/categories/', cursor(['created_at', 'id'], [[1], {'a': 1}])),
+            ('/api/courses/', cursor(newest, ['2026-01-01T00:00:00+00:00', 'abc'])),
+            ('/api/courses/', cursor(newest, [None, 1])),
+            ('/api/courses/', cursor(newest, ['2026-01-01T00:00:00+00:00'])),
+            # A cursor from ?ordering=price reused under the default ordering
+            ('/api/courses/', cursor(['effective_price', 'id'], [10.0, 1])),
+        ]:
+            with self.subTest(url=url, cursor=bad):
+                response = self.client.get(url, {'cursor': bad})
+                self.assertEqual(response.status_code, 404)
+
+    def test_search_cursor_needs_an_explicit_ordering(self):
+        response = self.client.get('/api/courses/', {'search': 'course', 'cursor': ''})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get('/api/courses/', {'search': 'course', 'cursor': '', 'ordering': 'newest'})
+        self.assertEqual(response.status_code, 200)
+
+
+class QueryPlanTests(CourseTestCase):
+    """Fails when a hot access path stops using an index and scans a whole table"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.student = create_user('student')
+        cls.lesson = Lesson.objects.create(course=cls.course, title='Lesson', video='v')
+        cls.enrollment = Enrollment.objects.create(user=cls.student, course=cls.course, price=10)
+        cls.enrollment.completed_lessons.add(cls.lesson)
+
+    def full_scans(self, sql, params=()):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            details = [row[-1] for row in cursor.fetchall()]
+        # "SCAN t USING INDEX ..." walks an index; a bare "SCAN t" reads the table
+        return [
+            detail for detail in details
+            if detail.startswith('SCAN ') and 'USING' not in detail
+            and 'VIRTUAL TABLE' not in detail and 'CONSTANT ROW' not in detail
+        ]
+
+    def assertNoFullScan(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        self.assertEqual(self.full_scans(sql, params), [], sql)
+
+    def assertQueriesUseIndexes(self, func):
+        with CaptureQueriesContext(connection) as queries:
+            func()
+        for query in queries.captured_queries:
+            if query['sql'].startswith('SELECT'):
+                self.assertEqual(self.full_scans(query['sql']), [], query['sql'])
+
+    def test_course_list_filters(self):
+        queryset = Course.objects.select_related('category', 'instructor')
+        for params in [
+            '',
+            f'category={self.category.pk}',
+            'level=Beginner',
+            'is_featured=true',
+            f'category={self.category.pk}&level=Beginner&is_featured=false',
+            'search=python',
+            'ordering=price',
+            'ordering=-price',
+            'ordering=rating',
+            'ordering=students',
+        ]:
+            with self.subTest(params=params):
+                self.assertNoFullScan(filter_courses(QueryDict(params), queryset)[:16])
+
+    def test_keyset_pages(self):
+        client = APIClient()
+        client.force_authenticate(self.student)
+        for url, position in [
+            ('/api/categories/', cursor(['created_at', 'id'], [self.category.created_at.isoformat(), self.category.pk])),
+            ('/api/lessons/', cursor(['sequence_number', 'id'], [self.lesson.sequence_number, self.lesson.pk])),
+        ]:
+            for page in ['', position]:
+                with self.subTest(url=url, cursor=page), CaptureQueriesContext(connection) as queries:
+                    client.get(url, {'cursor': page})
+                # The page itself; the ETag aggregate reads the whole table by design
+                sql = next(query['sql'] for query in queries.captured_queries if 'ORDER BY' in query['sql'])
+                with connection.cursor() as explain:
+                    explain.execute(f'EXPLAIN QUERY PLAN {sql}')
+                    details = [row[-1] for row in explain.fetchall()]
+                self.assertEqual(self.full_scans(sql), [], sql)
+                self.assertNotIn('USE TEMP B-TREE FOR ORDER BY', details, sql)
+
+    def test_check_enrollment(self):
+        client = APIClient()
+        client.force_authenticate(self.student)
+        self.assertQueriesUseIndexes(
+            lambda: client.get(f'/api/enrollments/check/{self.course.pk}/')
+        )
+
+    def test_list_reviews(self):
+        client = APIClient()
+        client.force_authenticate(self.student)
+        self.assertQueriesUseIndexes(
+            lambda: client.get(f'/api/courses/{self.course.pk}/reviews/')
+        )
+
+    def test_update_progress(self):
+        self.assertQueriesUseIndexes(self.enrollment.update_progress)
+
+
+class StudentCountTests(CourseTestCase):
+    def enroll(self, index):
+        student = create_user(f'student{index}')
+        return Enrollment.objects.create(user=student, course=self.course, price=10)
+
+    def students(self):
+        self.course.refresh_from_db()
+        return self.course.students
+
+    def test_counts_only_activation_changes(self):
+        enrollment = self.enroll(1)
+        self.enroll(2)
+        self.assertEqual(self.students(), 2)
+
+        enrollment = Enrollment.objects.get(pk=enrollment.pk)
+        enrollment.progress = 50
+        enrollment.save()
+        self.assertEqual(self.students(), 2)
+
+        enrollment.is_active = False
+        enrollment.save()
+        enrollment.save()
+        self.assertEqual(self.students(), 1)
+
+        enrollment.delete()
+        self.assertEqual(self.students(), 1)
+
+    def test_queryset_and_cascaded_deletes_count(self):
+        first, second = self.enroll(1), self.enroll(2)
+        Enrollment.objects.filter(pk=first.pk).delete()
+        self.assertEqual(self.students(), 1)
+        second.user.delete()
+        self.assertEqual(self.students(), 0)
+
+    @override_settings(STUDENT_COUNT_HOT_THRESHOLD=0)
+    def test_deleting_a_course_skips_its_counter(self):
+        self.enroll(1)
+        self.course.delete()
+        self.assertFalse(Course.objects.filter(pk=self.course.pk).exists())
+
+    def test_course_save_keeps_concurrent_counts(self):
+        course = Course.objects.get(pk=self.course.pk)
+        self.enroll(1)
+        course.title = 'Advanced Python'
+        course.save()
+        self.assertEqual(self.students(), 1)
+        self.assertEqual(self.course.title, 'Advanced Python')
+
+    def test_counter_updates_skip_the_snapshot_page_lookup(self):
+        snapshot_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(snapshot_dir.cleanup)
+        with open(os.path.join(snapshot_dir.name, 'manifest.json'), 'w') as f:
+            f.write('{}')
+
+        with override_settings(CATALOG_SNAPSHOT_DIR=snapshot_dir.name):
+            with self.assertNumQueries(1):
+                Course.adjust_students_count(self.course.pk, 1)
+
+    @override_settings(STUDENT_COUNT_HOT_THRESHOLD=0)
+    def test_hot_course_shards_are_reconciled(self):
+        self.enroll(1)
+        self.enroll(2)
+        self.enroll(3).delete()
+        self.assertEqual(self.students(), 0)
+        self.assertEqual(sum(self.course.student_count_shards.values_list('count', flat=True)), 2)
+
+        Course.objects.filter(pk=self.course.pk).update(students=7)
+        call_command('reconcile_student_counts', stdout=StringIO())
+        self.assertEqual(self.students(), 2)
+        self.assertFalse(self.course.student_count_shards.exists())
+
+
+class LessonCompletionBatchTests(CourseTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.student = create_user('student')
+        cls.lessons = [
+            Lesson.objects.create(course=cls.course, title=f'Lesson {number}', video='v')
+            for number in range(4)
+        ]
+        cls.enrollment = Enrollment.objects.create(user=cls.student, course=cls.course, price=10)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+        self.url = f'/api/enrollments/{self.enrollment.pk}/lessons/completions/'
+
+    def test_applies_batch_and_recomputes_progress_once(self):
+        ids = [lesson.pk for lesson in self.lessons]
+        response = self.client.post(self.url, {'completed': ids[:3]}, format='json')
+        self.assertEqual(response.data['progress'], 75)
+
+        response = self.client.post(
+            self.url, {'completed': ids[2:], 'incomplete': ids[:1]}, format='json'
+        )
+        self.assertEqual(response.data['progress'], 75)
+        self.assertEqual(sorted(response.data['completed_lessons']), ids[1:])
+        self.assertEqual(
+            sorted(self.enrollment.lesson_completions.values_list('lesson_id', flat=True)), ids[1:]
+        )
+
+    def test_single_lesson_endpoints_share_the_completion_store(self):
+        lesson = self.lessons[0]
+        base = f'/api/enrollments/{self.enrollment.pk}/lessons/{lesson.pk}'
+        response = self.client.post(f'{base}/complete/')
+        self.assertEqual(response.data['completed_lessons'], [lesson.pk])
+        self.assertIsNotNone(self.enrollment.lesson_completions.get().completed_at)
+        data = EnrollmentSerializer(self.enrollment).data
+        self.assertEqual(data['completed_lessons'], [lesson.pk])
+        self.assertNotIn('completion_bitmap', data)
+
+        response = self.client.post(f'{base}/incomplete/')
+        self.assertEqual(response.data['progress'], 0)
+        self.assertFalse(self.enrollment.lesson_completions.exists())
+
+    def test_progress_reads_completion_bitmap(self):
+        ids = [lesson.pk for lesson in self.lessons]
+        self.client.post(self.url, {'completed': [ids[0], ids[3]]}, format='json')
+        self.enrollment.refresh_from_db()
+        self.assertEqual(bytes(self.enrollment.completion_bitmap), bytes([0b1001]))
+
+        # Enrollment with its course + the lessons, no completion join
+        with self.assertNumQueries(2):
+            response = self.client.get(f'/api/courses/{self.course.pk}/progress/')
+        self.assertEqual(
+            [lesson['is_completed'] for lesson in response.data['lessons']],
+            [True, False, False, True]
+        )
+        self.assertEqual(response.data['completed_lessons'], 2)
+
+    def test_reordering_keeps_bits_in_place(self):
+        self.enrollment.apply_lesson_completions(completed=[self.lessons[3].pk])
+        # Moved the way the admin does it, without the lesson views
+        lesson = Lesson.objects.get(pk=self.lessons[3].pk)
+        lesson.sequence_number = 900
+        lesson.save()
+
+        self.enrollment.refresh_from_db()
+        self.assertEqual(bytes(self.enrollment.completion_bitmap), bytes([0b1000]))
+        response = self.client.get(f'/api/courses/{self.course.pk}/progress/')
+        self.assertEqual(
+            [lesson['is_completed'] for lesson in response.data['lessons']],
+            [False, False, False, True]
+        )
+
+    def test_deleted_lessons_free_no_slots_and_queue_a_recompute(self):
+        self.enrollment.apply_lesson_completions(completed=[self.lessons[0].pk, self.lessons[3].pk])
+        with self.captureOnCommitCallbacks(execute=True):
+            Lesson.objects.get(pk=self.lessons[3].pk).delete()
+        run_pending_jobs()
+
+        self.enrollment.refresh_from_db()
+        self.assertEqual(self.enrollment.completed_positions, {0})
+        self.assertEqual(self.enrollment.progress, 33)
+        lesson = Lesson.objects.create(course=self.course, title='New', video='v', sequence_number=500)
+        self.assertEqual(lesson.completion_slot, 4)
+
+    def test_rejects_lessons_from_other_courses(self):
+        response = self.client.post(self.url, {'completed': [self.lessons[0].pk, 999]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['missing'], [999])
+        self.assertFalse(self.enrollment.completed_lessons.exists())
+
+
+class LessonTotalsTests(CourseTestCase):
+    def totals(self):
+        self.course.refresh_from_db()
+        return self.course.active_lessons, self.course.active_lessons_duration
+
+    def test_totals_follow_lesson_changes(self):
+        section = CurriculumSection.objects.create(course=self.course, title='Intro')
+        first = Lesson.objects.create(course=self.course, section=section, title='A', video='v', duration='05:30')
+        Lesson.objects.create(course=self.course, section=section, title='B', video='v', duration='1:00:00')
+        self.assertEqual(self.totals(), (2, 3930))
+
+        first = Lesson.objects.get(pk=first.pk)
+        first.duration = '10:00'
+        first.save()
+        self.assertEqual(self.totals(), (2, 4200))
+
+        first.is_active = False
+        first.save()
+        self.assertEqual(self.totals(), (1, 3600))
+
+        first.delete()
+        self.assertEqual(self.totals(), (1, 3600))
+
+        section.delete()
+        self.assertEqual(self.totals(), (0, 0))
+
+
+class ProgressRecomputeTests(CourseTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.lessons = [
+            Lesson.objects.create(course=cls.course, title=f'Lesson {number}', video='v')
+            for number in range(2)
+        ]
+        cls.enrollments = []
+        for index in range(3):
+            student = create_user(f'student{index}')
+            enrollment = Enrollment.objects.create(user=student, course=cls.course, price=10)
+            enrollment.apply_lesson_completions(completed=[lesson.pk for lesson in cls.lessons[:index]])
+            cls.enrollments.append(enrollment)
+
+    def test_lesson_changes_queue_one_set_based_recompute(self):
+        client = APIClient()
+        client.force_authenticate(self.teacher)
+        with self.captureOnCommitCallbacks(execute=True):
+            client.post('/api/lessons/', {'course': self.course.pk, 'title': 'New', 'video': 'v'}, format='json')
+            client.patch(f'/api/lessons/{self.lessons[0].pk}/', {'title': 'Renamed'}, format='json')
+        self.assertEqual(ProgressRecomputeJob.objects.filter(status='pending').count(), 1)
+
+        # Lesson total + one UPDATE, however many students are enrolled
+        with self.assertNumQueries(2):
+            recompute_course_progress(self.course.pk)
+        self.assertEqual(run_pending_jobs(), 1)
+
+        progress = [
+            (enrollment.progress, enrollment.is_completed)
+            for enrollment in Enrollment.objects.order_by('pk')
+        ]
+        self.assertEqual(progress, [(0, False), (33, False), (66, False)])
+
+        response = client.get(f'/api/courses/{self.course.pk}/progress-jobs/')
+        self.assertEqual(response.data[0]['status'], 'done')
+        self.assertEqual(response.data[0]['enrollments_updated'], 3)
+
+
+class CompletionWriteBehindTests(CourseTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.student = create_user('student')
+        cls.lessons = [
+            Lesson.objects.create(course=cls.course, title=f'Lesson {number}', video='v')
+            for number in range(4)
+        ]
+        cls.enrollment = Enrollment.objects.create(user=cls.student, course=cls.course, price=10)
+
+    def setUp(self):
+        queue_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(queue_dir.cleanup)
+        settings_override = override_settings(
+            LESSON_COMPLETION_WRITE_BEHIND=True,
+            LESSON_COMPLETION_QUEUE_PATH=os.path.join(queue_dir.name, 'queue.sqlite3'),
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+
+    def post(self, lesson, action):
+        return self.client.post(
+            f'/api/enrollments/{self.enrollment.pk}/lessons/{lesson.pk}/{action}/'
+        )
+
+    def test_queues_events_and_flushes_coalesced(self):
+        self.post(self.lessons[0], 'complete')
+        self.post(self.lessons[1], 'complete')
+        self.post(self.lessons[1], 'incomplete')
+        response = self.post(self.lessons[2], 'complete')
+
+        self.assertTrue(response.data['queued'])
+        self.assertEqual(response.data['progress'], 50)
+        self.assertEqual(response.data['completed_lessons'], [self.lessons[0].pk, self.lessons[2].pk])
+        self.assertFalse(self.enrollment.lesson_completions.exists())
+
+        self.assertEqual(completion_queue.flush_all(), 4)
+        self.enrollment.refresh_from_db()
+        self.assertEqual(self.enrollment.progress, 50)
+        self.assertEqual(
+            sorted(self.enrollment.lesson_completions.values_list('lesson_id', flat=True)),
+            [self.lessons[0].pk, self.lessons[2].pk]
+        )
+        self.assertEqual(completion_queue.flush_all(), 0)
+
+    def test_queued_inactive_lessons_do_not_count(self):
+        inactive = Lesson.objects.create(course=self.course, title='Draft', video='v', is_active=False)
+        self.post(self.lessons[0], 'complete')
+        response = self.post(inactive, 'complete')
+        self.assertEqual((response.data['progress'], response.data['completed_lessons']), (25, [self.lessons[0].pk]))
+
+        completion_queue.flush_all()
+        self.enrollment.refresh_from_db()
+        self.assertEqual(self.enrollment.progress, 25)
+
+    def test_reads_merge_queued_events_without_flushing(self):
+        cache.clear()
+        self.post(self.lessons[0], 'complete')
+
+        progress = self.client.get(f'/api/courses/{self.course.pk}/progress/').data
+        self.assertEqual(progress['progress_percentage'], 25)
+        self.assertEqual([lesson['is_completed'] for lesson in progress['lessons']], [True, False, False, False])
+        player = self.client.get(f'/api/courses/{self.course.pk}/player/').data
+        self.assertEqual((player['completed_lessons'], player['next_lesson']['id']), (1, self.lessons[1].pk))
+
+        self.assertFalse(self.enrollment.lesson_completions.exists())
+        self.assertEqual(completion_queue.flush_all(), 1)
+
+    def test_batches_queue_behind_earlier_clicks(self):
+        self.post(self.lessons[0], 'complete')
+        response = self.client.post(
+            f'/api/enrollments/{self.enrollment.pk}/lessons/completions/',
+            {'completed': [self.lessons[1].pk], 'incomplete': [self.lessons[0].pk]},
+            format='json'
+        )
+        self.assertEqual(response.data['completed_lessons'], [self.lessons[1].pk])
+
+        self.assertEqual(completion_queue.flush_all(), 3)
+        self.assertEqual(
+            list(self.enrollment.lesson_completions.values_list('lesson_id', flat=True)), [self.lessons[1].pk]
+        )
+
+    def test_enrollments_claimed_by_another_flusher_are_skipped(self):
+        self.post(self.lessons[0], 'complete')
+        connection = completion_queue._connection()
+        claim, rows = completion_queue._claim(connection, batch_size=1)
+        self.assertEqual(len(rows), 1)
+
+        self.post(self.lessons[1], 'complete')
+        self.assertEqual(completion_queue.flush(), 0)
+
+        # A claim left by a crashed flusher expires
+        connection.execute(
+            'UPDATE completion_events SET claimed_at = claimed_at - ? WHERE claim = ?',
+            (completion_queue.CLAIM_TIMEOUT + 1, claim)
+        )
+        self.assertEqual(completion_queue.flush_all(), 2)
+        self.assertEqual(self.enrollment.lesson_completions.count(), 2)
+
+
+class UserEnrollmentsTests(CacheTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = create_user('student')
+        category = Category.objects.create(title='Programming')
+        for index in range(5):
+            teacher = create_user(f'teacher{index}', role='teacher', full_name=f'Teacher {index}')
+            course = create_course(teacher, category, title=f'Course {index}')
+            section = CurriculumSection.objects.create(course=course, title='Intro')
+            lesson = Lesson.objects.create(course=course, section=section, title='Lesson', video='v')
+            enrollment = Enrollment.objects.create(user=cls.student, course=course, price=10)
+            enrollment.apply_lesson_completions(completed=[lesson.pk])
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+
+    def test_batch_check_uses_cached_course_set(self):
+        course_ids = list(Course.objects.order_by('pk').values_list('pk', flat=True))
+        params = {'ids': ','.join(str(pk) for pk in course_ids + [999])}
+        cache.clear()
+        self.client.get('/api/enrollments/check/', params)
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/enrollments/check/', params)
+        self.assertEqual(response.data['is_enrolled'], {**{pk: True for pk in course_ids}, 999: False})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            enrollment = Enrollment.objects.get(user=self.student, course_id=course_ids[0])
+            enrollment.is_active = False
+            enrollment.save()
+        response = self.client.get(f'/api/enrollments/check/{course_ids[0]}/')
+        self.assertFalse(response.data['is_enrolled'])
+
+    def test_cards_run_one_query(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/enrollments/')
+        card = response.data[0]
+        self.assertEqual(card['course']['instructor_name'], 'Teacher 4')
+        self.assertEqual(card['progress'], 100)
+        self.assertIsNotNone(card['last_activity'])
+        self.assertNotIn('curriculum', card['course'])
+
+    def test_expanded_form_prefetches(self):
+        # Enrollments + sections + lessons + completed lessons
+        with self.assertNumQueries(4):
+            response = self.client.get('/api/enrollments/', {'expand': 'course'})
+        self.assertEqual(len(response.data[0]['course']['curriculum'][0]['lectures']), 1)
+        self.assertEqual(len(response.data[0]['completed_lessons']), 1)
+
+
+class EnrollmentPaymentTests(CourseTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.student = create_user('student')
+        cls.enrollment = Enrollment.objects.create(
+            user=cls.student, course=cls.course, price=10, is_active=False
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+
+    def test_paying_reactivates_an_inactive_enrollment(self):
+        intent = SimpleNamespace(
+            status='succeeded', amount=1500,
+            metadata={'course_id': str(self.course.pk), 'user_id': str(self.student.pk)},
+        )
+        with mock.patch('stripe.PaymentIntent.retrieve', return_value=intent):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(
+                    '/api/payment/process/',
+                    {'course_id': self.course.pk, 'payment_intent_id': 'pi_1'}, format='json'
+                )
+        self.assertEqual(response.status_code, 200)
+        self.enrollment.refresh_from_db()
+        self.assertEqual((self.enrollment.is_active, self.enrollment.price), (True, 15))
+        self.assertIn(self.course.pk, Enrollment.active_course_ids(self.student.pk))
+
+    def test_progress_writes_keep_the_cached_course_set(self):
+        self.enrollment.is_active = True
+        self.enrollment.save()
+        Enrollment.active_course_ids(self.student.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.enrollment.update_progress()
+        with self.assertNumQueries(0):
+            Enrollment.active_course_ids(self.student.pk)
+
+
+class CoursePlayerTests(CourseTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.student = create_user('student')
+        intro = CurriculumSection.objects.create(course=cls.course, title='Intro')
+        basics = CurriculumSection.objects.create(course=cls.course, title='Basics')
+        cls.lessons = [
+            Lesson.objects.create(
+                course=cls.course, section=section, title=f'Lesson {number}', video='v', duration='10:00'
+            )
+            for number, section in enumerate([intro, intro, basics])
+        ]
+        cls.enrollment = Enrollment.objects.create(user=cls.student, course=cls.course, price=10)
+        cls.enrollment.apply_lesson_completions(completed=[cls.lessons[0].pk, cls.lessons[2].pk])
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+        self.url = f'/api/courses/{self.course.pk}/player/'
+
+    def test_player_is_one_query_then_cached(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        data = response.data
+        self.assertEqual([section['title'] for section in data['sections']], ['Intro', 'Basics'])
+        self.assertEqual(
+            [lesson['is_completed'] for lesson in data['sections'][0]['lessons']], [True, False]
+        )
+        self.assertEqual(data['next_lesson']['id'], self.lessons[1].pk)
+        self.assertEqual((data['completed_lessons'], data['total_lessons']), (2, 3))
+        self.assertEqual(data['total_duration'], 1800)
+        self.assertIsNotNone(data['last_completed_at'])
+
+        with self.assertNumQueries(0):
+            self.client.get(self.url)
+
+    def test_completion_moves_the_player_version(self):
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/enrollments/{self.enrollment.pk}/lessons/{self.lessons[1].pk}/complete/')
+        response = self.client.get(self.url)
+        self.assertIsNone(response.data['next_lesson'])
+        self.assertEqual(response.data['progress_percentage'], 100)
+
+    def test_queued_completions_move_the_player_version(self):
+        queue_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(queue_dir.cleanup)
+        self.client.get(self.url)
+        with override_settings(
+            LESSON_COMPLETION_WRITE_BEHIND=True,
+            LESSON_COMPLETION_QUEUE_PATH=os.path.join(queue_dir.name, 'queue.sqlite3'),
+        ):
+            self.client.post(f'/api/enrollments/{self.enrollment.pk}/lessons/{self.lessons[0].pk}/incomplete/')
+            response = self.client.get(self.url)
+        self.assertEqual(response.data['next_lesson']['id'], self.lessons[0].pk)
+        self.assertEqual(response.data['completed_lessons'], 1)
+
+    def test_requires_enrollment(self):
+        other = create_user('other')
+        self.client.force_authenticate(other)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+
+class CatalogSnapshotTests(CourseTestCase):
+    def setUp(self):
+        snapshot_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(snapshot_dir.cleanup)
+        self.snapshot_dir = snapshot_dir.name
+        settings_override = override_settings(CATALOG_SNAPSHOT_DIR=self.snapshot_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.client = APIClient()
+        call_command('build_catalog_snapshot', stdout=StringIO())
+
+    def manifest(self):
+        with open(os.path.join(self.snapshot_dir, 'manifest.json')) as f:
+            return json.load(f)
+
+    def served_titles(self, **headers):
+        response = self.client.get('/api/courses/', **headers)
+        self.assertIsInstance(response, FileResponse)
+        content = b''.join(response.streaming_content)
+        response.close()
+        if response.headers.get('Content-Encoding') == 'gzip':
+            content = gzip.decompress(content)
+        return [course['title'] for course in json.loads(content)['results']]
+
+    def test_build_writes_compressed_pages(self):
+        manifest = self.manifest()
+        self.assertEqual(set(manifest), {snapshot.COURSES, snapshot.CATEGORIES})
+        path = os.path.join(self.snapshot_dir, manifest[snapshot.COURSES]['1'])
+        self.assertTrue(os.path.exists(path))
+        self.assertTrue(os.path.exists(f'{path}.gz'))
+
+    def test_anonymous_listing_is_served_from_disk(self):
+        self.assertEqual(self.served_titles(), ['Python'])
+        response = self.client.get('/api/courses/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        response.close()
+        self.assertEqual(self.served_titles(HTTP_ACCEPT_ENCODING='gzip'), ['Python'])
+
+        # Filters and signed-in users go through the view
+        self.assertNotIsInstance(self.client.get('/api/courses/?level=Beginner'), FileResponse)
+        self.client.force_authenticate(self.teacher)
+        self.assertNotIsInstance(self.client.get('/api/courses/'), FileResponse)
+
+    def test_changes_are_rebuilt_by_the_worker(self):
+        old = self.manifest()[snapshot.COURSES]['1']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.course.title = 'Advanced Python'
+            self.course.save()
+        self.assertEqual(self.manifest()[snapshot.COURSES]['1'], old)
+        self.assertTrue(SnapshotRebuild.objects.exists())
+
+        call_command('run_snapshot_rebuilds', '--once', stdout=StringIO())
+        self.assertFalse(SnapshotRebuild.objects.exists())
+        self.assertEqual(self.served_titles(), ['Advanced Python'])
+        self.assertFalse(os.path.exists(os.path.join(self.snapshot_dir, old)))
+
+    def test_new_courses_rebuild_every_page(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            create_course(self.teacher, self.category, title='Django')
+        self.assertEqual(
+            list(SnapshotRebuild.objects.values_list('kind', 'page')), [(snapshot.COURSES, 0)]
+        )
+        snapshot.run_pending_rebuilds()
+        self.assertEqual(self.served_titles(), ['Django', 'Python'])
+
+    def test_counter_changes_queue_the_course_once(self):
+        for _ in range(3):
+            with self.captureOnCommitCallbacks(execute=True):
+                Course.adjust_students_count(self.course.pk, 1)
+        self.assertEqual(
+            list(SnapshotRebuild.objects.values_list('kind', 'course_id')), [(snapshot.COURSES, self.course.pk)]
+        )
+
+        # Claimed rows no longer absorb new changes
+        SnapshotRebuild.objects.update(claimed=True)
+        with self.captureOnCommitCallbacks(execute=True):
+            Course.adjust_students_count(self.course.pk, 1)
+        self.assertEqual(SnapshotRebuild.objects.filter(claimed=False).count(), 1)
+
+        self.assertEqual(snapshot.run_pending_rebuilds(), 2)
+        response = self.client.get('/api/courses/')
+        content = b''.join(response.streaming_content)
+        response.close()
+        self.assertEqual(json.loads(content)['results'][0]['students'], 4)
+        self.assertFalse(SnapshotRebuild.objects.exists())
+
+    def test_rolled_back_changes_are_not_queued(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            create_course(self.teacher, self.category, title='Django')
+            raise RuntimeError
+        self.assertFalse(SnapshotRebuild.objects.exists())
+
+    def test_partial_rebuilds_keep_other_manifest_entries(self):
+        categories = self.manifest()[snapshot.CATEGORIES]
+        with mock.patch.object(snapshot.fcntl, 'flock', wraps=snapshot.fcntl.flock) as flock:
+            snapshot.rebuild_pages({snapshot.COURSES: {1}})
+        flock.assert_called_once_with(mock.ANY, snapshot.fcntl.LOCK_EX)
+        self.assertEqual(self.manifest()[snapshot.CATEGORIES], categories)
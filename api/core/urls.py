@@ -3,8 +3,10 @@ from .views import (
     category_list,
     category_create,
     course_list,
+    course_facets,
     create_course,
     public_course_detail,
+    course_batch,
     update_course,
     delete_course,
     lesson_list_create,
@@ -16,9 +18,13 @@ from .views import (
     process_payment,
     user_enrollments,
     check_enrollment,
+    check_enrollments,
     mark_lesson_completed,
     mark_lesson_incomplete,
+    update_lesson_completions,
     get_course_progress,
+    course_progress_jobs,
+    course_player,
 )
 
 urlpatterns = [
@@ -28,6 +34,8 @@ urlpatterns = [
     
     # Course endpoints
    path("courses/", course_list, name="course-list"),
+    path("courses/facets/", course_facets, name="course-facets"),
+    path("courses/batch/", course_batch, name="course-batch"),
     path("courses/create/", create_course, name="create-course"),
     path("courses/<int:pk>/", public_course_detail, name="course-public-detail"),
     path("courses/<int:pk>/update/", update_course, name="course-update"),
@@ -50,10 +58,14 @@ urlpatterns = [
     
     # enrolled
     path('enrollments/', user_enrollments, name='user-enrollments'),
+    path('enrollments/check/', check_enrollments, name='check-enrollments'),
     path('enrollments/check/<int:course_id>/', check_enrollment, name='check-enrollment'),
     
     # Add these to your urls.py
     path('enrollments/<int:enrollment_id>/lessons/<int:lesson_id>/complete/', mark_lesson_completed, name='mark-lesson-completed'),
     path('enrollments/<int:enrollment_id>/lessons/<int:lesson_id>/incomplete/', mark_lesson_incomplete, name='mark-lesson-incomplete'),
+    path('enrollments/<int:enrollment_id>/lessons/completions/', update_lesson_completions, name='update-lesson-completions'),
     path('courses/<int:course_id>/progress/', get_course_progress, name='course-progress'),
+    path('courses/<int:course_id>/player/', course_player, name='course-player'),
+    path('courses/<int:course_id>/progress-jobs/', course_progress_jobs, name='course-progress-jobs'),
 ]
\ No newline at end of file
@@ -4,23 +4,50 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework import status
 from rest_framework.pagination import PageNumberPagination
 from rest_framework.permissions import AllowAny
-from django.db.models import Q
-from rest_framework.exceptions import PermissionDenied
-from django.db.models import Exists, OuterRef
+from rest_framework.exceptions import PermissionDenied, NotFound
+from django.db import transaction
+from django.db.models import OuterRef, Subquery, Max, Count, Case, When, Value, CharField
+from django.db.models.functions import Coalesce
+from django.core.exceptions import ValidationError as DjangoValidationError
 from django.core.cache import cache
+from .caching import (
+    COURSE_DETAIL_CACHE_TIMEOUT,
+    COURSE_FACETS_CACHE_TIMEOUT,
+    COURSE_PLAYER_CACHE_TIMEOUT,
+    bump_completion_version,
+    course_detail_cache_key,
+    course_facets_cache_key,
+    course_player_cache_key,
+    get_catalog_version,
+    get_course_version,
+    get_course_versions,
+)
+from . import completion_queue
+from .conditional import conditional_view
+from .pagination import KeysetPagination
 from .permissions import IsStudentUser
+from .search import get_search_backend
+from .snapshot import CATEGORIES, COURSES, snapshot_view
 from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework.decorators import authentication_classes
-from .models import Category, Course, Lesson, Material, Enrollment, QuestionAnswer, CurriculumSection, LessonCompletion
+from .models import (
+    parse_duration,
+    Category, Course, Lesson, Material, Enrollment, QuestionAnswer, CurriculumSection, LessonCompletion,
+    ProgressRecomputeJob
+)
 LessonCompletion
 from .serializers import (
     CategorySerializer,
     CourseSerializer,
+    CourseListSerializer,
     LessonSerializer,
     EnrollmentSerializer,
+    EnrollmentCardSerializer,
+    LessonCompletionBatchSerializer,
     QuestionAnswerSerializer,
     CurriculumSectionSerializer,
-    PaymentSerializer
+    PaymentSerializer,
+    ProgressRecomputeJobSerializer
 )
 from drf_yasg.utils import swagger_auto_schema
 from django.conf import settings
@@ -46,13 +73,27 @@ class MyPagination(PageNumberPagination):
             'current_page': self.page.number,
         })
 
+
+def get_paginator(request, ordering):
+    """Keyset pagination when the client opts in with ?cursor=, page numbers otherwise"""
+    if KeysetPagination.cursor_query_param in request.query_params:
+        return KeysetPagination(ordering)
+    return MyPagination()
+
+
+def category_list_state(request):
+    stats = Category.objects.aggregate(latest=Max('updated_at'), count=Count('id'))
+    return stats['count'], stats['latest']
+
 # Public GET endpoint for categories
 @swagger_auto_schema(method='get', auto_schema=None)
 @api_view(["GET"])
 @permission_classes([AllowAny])
+@snapshot_view(CATEGORIES)
+@conditional_view(category_list_state)
 def category_list(request):
-    categories = Category.objects.all()
-    paginator = MyPagination()
+    categories = Category.objects.order_by('created_at', 'id')
+    paginator = get_paginator(request, ('created_at', 'id'))
     result_page = paginator.paginate_queryset(categories, request)
     serializer = CategorySerializer(result_page, many=True)
     return paginator.get_paginated_response(serializer.data)
@@ -74,40 +115,94 @@ def category_create(request):
         return Response(serializer.data, status=status.HTTP_201_CREATED)
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+# ?ordering= options for course_list; each ends in id for stable keyset pages
+COURSE_ORDERINGS = {
+    'newest': ('-created_at', '-id'),
+    'price': ('effective_price', 'id'),
+    '-price': ('-effective_price', '-id'),
+    'rating': ('-rating', '-id'),
+    'students': ('-students', '-id'),
+}
+
+
+def filter_courses(params, queryset=None):
+    """Applies the catalog filter and search params shared by the course listing endpoints"""
+    if queryset is None:
+        queryset = Course.objects.all()
+
+    category = params.get('category')
+    if category and category != 'all':
+        queryset = queryset.filter(category_id=category)
+    
+    level = params.get('level')
+    if level and level != 'all':
+        queryset = queryset.filter(level=level)
+    
+    is_featured = params.get('is_featured')
+    if is_featured:
+        if is_featured.lower() == 'true':
+            queryset = queryset.filter(is_featured=True)
+        elif is_featured.lower() == 'false':
+            queryset = queryset.filter(is_featured=False)
+        
+    search = params.get('search')
+    ordering = COURSE_ORDERINGS.get(params.get('ordering'))
+    if search:
+        # Search results come back ordered by relevance unless asked otherwise
+        queryset = get_search_backend().search(queryset, search)
+        if ordering:
+            queryset = queryset.order_by(*ordering)
+    else:
+        queryset = queryset.order_by(*(ordering or COURSE_ORDERINGS['newest']))
+    return queryset
+
+def course_list_state(request):
+    try:
+        stats = filter_courses(request.query_params).order_by().aggregate(
+            latest=Max('updated_at'),
+            category_latest=Max('category__updated_at'),
+            count=Count('id'),
+        )
+    except (ValueError, DjangoValidationError):
+        return None
+    return stats['count'], stats['latest'], stats['category_latest'], get_catalog_version()
+
 @api_view(["GET"])
 @permission_classes([AllowAny])
+@snapshot_view(COURSES)
+@conditional_view(course_list_state)
 def course_list(request):
+    ordering = request.query_params.get('ordering', 'newest')
+    if ordering not in COURSE_ORDERINGS:
+        return Response(
+            {"ordering": f"Must be one of: {', '.join(COURSE_ORDERINGS)}"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    # Keyset pages follow a fixed column order, not search relevance
+    cursor_mode = KeysetPagination.cursor_query_param in request.query_params
+    if cursor_mode and request.query_params.get('search') and 'ordering' not in request.query_params:
+        return Response(
+            {"ordering": "Required with ?cursor= when searching; cursor pages can't follow relevance"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
     try:
-        queryset = Course.objects.select_related('category').all()
-        
-        category = request.query_params.get('category')
-        if category and category != 'all':
-            queryset = queryset.filter(category_id=category)
-        
-        level = request.query_params.get('level')
-        if level and level != 'all':
-            queryset = queryset.filter(level=level)
+        queryset = Course.objects.select_related('category', 'instructor')
+
+        # Cards by default; ?expand=curriculum returns the full course
+        expand_curriculum = request.query_params.get('expand') == 'curriculum'
+        if expand_curriculum:
+            queryset = queryset.prefetch_related('curriculum__lectures')
         
-        is_featured = request.query_params.get('is_featured')
-        if is_featured:
-            if is_featured.lower() == 'true':
-                queryset = queryset.filter(is_featured=True)
-            elif is_featured.lower() == 'false':
-                queryset = queryset.filter(is_featured=False)
-            
-        search = request.query_params.get('search')
-        if search:
-            queryset = queryset.filter(
-                Q(title__icontains=search) | 
-                Q(description__icontains=search)
-            )
+        queryset = filter_courses(request.query_params, queryset)
         
-        # Ordering and pagination
-        queryset = queryset.order_by('-created_at')
-        paginator = MyPagination()
+        # Pagination
+        paginator = get_paginator(request, COURSE_ORDERINGS[ordering])
         result_page = paginator.paginate_queryset(queryset, request)
         
-        serializer = CourseSerializer(
+        serializer_class = CourseSerializer if expand_curriculum else CourseListSerializer
+        serializer = serializer_class(
             result_page, 
             many=True,
             context={'request': request}
@@ -115,12 +210,84 @@ def course_list(request):
         
         return paginator.get_paginated_response(serializer.data)
     
+    except NotFound:
+        raise
     except Exception as e:
         return Response(
             {"detail": str(e)},
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
 
+# (facet value, exclusive upper bound) on the effective price; the last band is open-ended
+COURSE_PRICE_BANDS = [
+    ('free', None),
+    ('under_20', 20),
+    ('20_to_50', 50),
+    ('50_to_100', 100),
+    ('over_100', None),
+]
+COURSE_FACET_PARAMS = ('category', 'level', 'is_featured', 'search')
+
+
+def price_band_expression():
+    """Buckets the stored effective price into COURSE_PRICE_BANDS"""
+    whens = [When(effective_price__lte=0, then=Value('free'))]
+    for band, upper in COURSE_PRICE_BANDS[1:-1]:
+        whens.append(When(effective_price__lt=upper, then=Value(band)))
+    return Case(*whens, default=Value(COURSE_PRICE_BANDS[-1][0]), output_field=CharField())
+
+
+@api_view(["GET"])
+@permission_classes([AllowAny])
+def course_facets(request):
+    """Catalog sidebar counts for the current filters, from one grouped aggregate query"""
+    params = {
+        name: request.query_params[name]
+        for name in COURSE_FACET_PARAMS if request.query_params.get(name)
+    }
+    cache_key = course_facets_cache_key(params)
+    data = cache.get(cache_key)
+    if data is not None:
+        return Response(data)
+
+    try:
+        rows = list(
+            filter_courses(params).order_by()
+            .annotate(price_band=price_band_expression())
+            .values('category_id', 'category__title', 'level', 'is_featured', 'price_band')
+            .annotate(count=Count('id'))
+        )
+    except (ValueError, DjangoValidationError) as e:
+        return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    categories, levels, featured, price_bands = {}, {}, {'true': 0, 'false': 0}, {}
+    for row in rows:
+        count = row['count']
+        category = categories.setdefault(
+            row['category_id'],
+            {'id': row['category_id'], 'name': row['category__title'], 'count': 0}
+        )
+        category['count'] += count
+        levels[row['level']] = levels.get(row['level'], 0) + count
+        featured['true' if row['is_featured'] else 'false'] += count
+        price_bands[row['price_band']] = price_bands.get(row['price_band'], 0) + count
+
+    data = {
+        'count': sum(row['count'] for row in rows),
+        'categories': sorted(categories.values(), key=lambda c: c['name']),
+        'levels': [
+            {'value': value, 'count': levels.get(value, 0)}
+            for value, _ in Course.LEVEL_CHOICES
+        ],
+        'is_featured': featured,
+        'price_bands': [
+            {'value': band, 'count': price_bands.get(band, 0)}
+            for band, _ in COURSE_PRICE_BANDS
+        ],
+    }
+    cache.set(cache_key, data, COURSE_FACETS_CACHE_TIMEOUT)
+    return Response(data)
+
 @swagger_auto_schema(method="post", request_body=CourseSerializer)
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
@@ -148,18 +315,94 @@ def create_course(request):
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+def course_detail_state(request, pk):
+    stats = Course.objects.filter(pk=pk).aggregate(
+        latest=Max('updated_at'),
+        category_latest=Max('category__updated_at'),
+        lessons_latest=Max('lesson__updated_at'),
+        lessons=Count('lesson'),
+    )
+    if stats['latest'] is None:
+        return None
+    # The version covers sections, the instructor and counter UPDATEs, which
+    # leave no timestamps behind
+    return (
+        stats['lessons'], stats['latest'], stats['category_latest'], stats['lessons_latest'],
+        get_course_version(pk),
+    )
+
 @swagger_auto_schema(method="get", responses={200: CourseSerializer})
 @api_view(["GET"])
 @permission_classes([AllowAny]) 
+@conditional_view(course_detail_state)
 def public_course_detail(request, pk):
     """Public endpoint to retrieve course details (no authentication required)"""
+    cache_key = course_detail_cache_key(pk)
+    data = cache.get(cache_key)
+    if data is not None:
+        return Response(data)
+
     try:
-        course = Course.objects.get(pk=pk)
+        course = Course.objects.select_related('category', 'instructor').prefetch_related(
+            'curriculum__lectures'
+        ).get(pk=pk)
     except Course.DoesNotExist:
         return Response({"detail": "Course not found"}, status=404)
 
-    serializer = CourseSerializer(course)
-    return Response(serializer.data)
+    data = CourseSerializer(course).data
+    cache.set(cache_key, data, COURSE_DETAIL_CACHE_TIMEOUT)
+    return Response(data)
+
+MAX_BATCH_COURSES = 100
+
+
+def parse_course_ids(request):
+    """Reads ?ids=1,2,3 for the batch endpoints; returns (ids, error response)"""
+    raw_ids = [value for value in request.query_params.get('ids', '').split(',') if value.strip()]
+    try:
+        ids = list(dict.fromkeys(int(value) for value in raw_ids))
+    except ValueError:
+        return None, Response({"ids": "Must be a comma separated list of course IDs"}, status=400)
+    if not ids:
+        return None, Response({"ids": "This parameter is required"}, status=400)
+    if len(ids) > MAX_BATCH_COURSES:
+        return None, Response(
+            {"ids": f"At most {MAX_BATCH_COURSES} courses can be requested at once"},
+            status=400
+        )
+    return ids, None
+
+
+@api_view(["GET"])
+@permission_classes([AllowAny])
+def course_batch(request):
+    """
+    Public endpoint returning several course details at once (?ids=1,2,3).
+    Warm entries come from the per-course detail cache; unknown IDs are
+    reported under "missing" instead of failing the request.
+    """
+    ids, error = parse_course_ids(request)
+    if error:
+        return error
+
+    versions = get_course_versions(ids)
+    keys = {pk: course_detail_cache_key(pk, versions[pk]) for pk in ids}
+    cached = cache.get_many(keys.values())
+    payloads = {pk: cached[keys[pk]] for pk in ids if keys[pk] in cached}
+
+    cold = [pk for pk in ids if pk not in payloads]
+    if cold:
+        courses = Course.objects.select_related('category', 'instructor').prefetch_related(
+            'curriculum__lectures'
+        ).in_bulk(cold)
+        fresh = {pk: CourseSerializer(course).data for pk, course in courses.items()}
+        cache.set_many({keys[pk]: data for pk, data in fresh.items()}, COURSE_DETAIL_CACHE_TIMEOUT)
+        payloads.update(fresh)
+
+    return Response({
+        "results": [payloads[pk] for pk in ids if pk in payloads],
+        "missing": [pk for pk in ids if pk not in payloads],
+    })
 
 @swagger_auto_schema(method="put", request_body=CourseSerializer, responses={200: CourseSerializer})
 @api_view(["PUT"])
@@ -212,7 +455,7 @@ def delete_course(request, pk):
 def lesson_list_create(request, pk=None):
     if request.method == "GET":
         lessons = Lesson.objects.all()
-        paginator = MyPagination()
+        paginator = get_paginator(request, ('sequence_number', 'id'))
         result_page = paginator.paginate_queryset(lessons, request)
         serializer = LessonSerializer(result_page, many=True)
         return paginator.get_paginated_response(serializer.data)
@@ -328,10 +571,12 @@ def teacher_dashboard(request):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def my_enrollments(request):
-    enrollments = Enrollment.objects.filter(user=request.user)
+    enrollments, serializer_class = enrollment_listing(
+        request, Enrollment.objects.filter(user=request.user).order_by('-created_at', '-id')
+    )
     paginator = MyPagination()
     result_page = paginator.paginate_queryset(enrollments, request)
-    serializer = EnrollmentSerializer(result_page, many=True)
+    serializer = serializer_class(result_page, many=True)
     return paginator.get_paginated_response(serializer.data)
 
 
@@ -454,7 +699,7 @@ def get_payment_details(request, course_id):
         
         logger.info(f"Course found: {course.title}")
         
-        if Enrollment.objects.filter(user=user, course=course).exists():
+        if course.pk in Enrollment.active_course_ids(user.pk):
             logger.info("User already enrolled")
             return Response({
                 "already_enrolled": True,
@@ -524,20 +769,25 @@ def process_payment(request):
         course = Course.objects.get(id=data['course_id'])
         price_paid = intent.amount / 100
         
-        enrollment, created = Enrollment.objects.get_or_create(
-            user=user,
-            course=course,
-            defaults={'is_active': True, 'price': price_paid}
-        )
-        
-        if not created:
-            return Response({"message": "Already enrolled"}, status=200)
+        with transaction.atomic():
+            enrollment, created = Enrollment.objects.select_for_update().get_or_create(
+                user=user,
+                course=course,
+                defaults={'is_active': True, 'price': price_paid}
+            )
+            if not created:
+                if enrollment.is_active:
+                    return Response({"message": "Already enrolled"}, status=200)
+                # get_payment_details charges inactive enrollments, so paying reactivates them
+                enrollment.is_active = True
+                enrollment.price = price_paid
+                enrollment.save()
 
         return Response({
             "message": "Enrollment successful",
             "enrollment_id": enrollment.id,
             "amount_paid": price_paid
-        }, status=201)
+        }, status=201 if created else 200)
 
     except Course.DoesNotExist:
         return Response({"error": "Course not found"}, status=404)
@@ -553,45 +803,67 @@ class PaymentHistoryPagination(PageNumberPagination):
     max_page_size = 100
 
 
+def enrollment_listing(request, enrollments):
+    """
+    Cards (course summary, progress, last activity) by default;
+    ?expand=course returns the full enrollment with course and curriculum.
+    """
+    if request.query_params.get('expand') == 'course':
+        enrollments = enrollments.select_related(
+            'user', 'course__category', 'course__instructor'
+        ).prefetch_related('course__curriculum__lectures', 'completed_lessons')
+        return enrollments, EnrollmentSerializer
+
+    enrollments = enrollments.select_related('course__instructor').annotate(
+        last_activity=Coalesce(Max('lesson_completions__completed_at'), 'created_at')
+    )
+    return enrollments, EnrollmentCardSerializer
+
+
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def user_enrollments(request):
-    enrollments = Enrollment.objects.filter(
+    enrollments, serializer_class = enrollment_listing(request, Enrollment.objects.filter(
         user=request.user, 
         is_active=True
-    ).select_related('course')
-    serializer = EnrollmentSerializer(enrollments, many=True)
+    ).order_by('-created_at', '-id'))
+    serializer = serializer_class(enrollments, many=True)
     return Response(serializer.data)
 
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def check_enrollment(request, course_id):
-    is_enrolled = Enrollment.objects.filter(
-        user=request.user,
-        course_id=course_id,
-        is_active=True
-    ).exists()
+    is_enrolled = course_id in Enrollment.active_course_ids(request.user.pk)
     return Response({"is_enrolled": is_enrolled})
 
 
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def check_enrollments(request):
+    """Enrollment badges for many courses at once (?ids=1,2,3)"""
+    ids, error = parse_course_ids(request)
+    if error:
+        return error
+    enrolled = Enrollment.active_course_ids(request.user.pk)
+    return Response({"is_enrolled": {course_id: course_id in enrolled for course_id in ids}})
+
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated, IsStudentUser])
 def mark_lesson_completed(request, enrollment_id, lesson_id):
     try:
-        enrollment = Enrollment.objects.get(id=enrollment_id, user=request.user)
+        enrollment = Enrollment.objects.select_related('course').get(id=enrollment_id, user=request.user)
         lesson = Lesson.objects.get(id=lesson_id, course=enrollment.course)
     except (Enrollment.DoesNotExist, Lesson.DoesNotExist):
         return Response({"detail": "Not found"}, status=status.HTTP_404_NOT_FOUND)
 
-    print(f"Before: progress={enrollment.progress}, completed_lessons={enrollment.completed_lessons.count()}")
-
-    enrollment.completed_lessons.add(lesson)
-    LessonCompletion.objects.get_or_create(enrollment=enrollment, lesson=lesson)
-    enrollment.update_progress()
-    enrollment.refresh_from_db()  #
+    if completion_queue.is_enabled():
+        completion_queue.enqueue(enrollment.pk, lesson.pk, completed=True)
+        bump_completion_version(enrollment.course_id, request.user.pk)
+        return queued_completion_response(enrollment, lesson_id, "Lesson marked as completed", True)
 
-    print(f"After: progress={enrollment.progress}, completed_lessons={enrollment.completed_lessons.count()}")
+    enrollment.apply_lesson_completions(completed=[lesson.pk])
 
     return Response({
         "detail": "Lesson marked as completed",
@@ -607,11 +879,16 @@ def mark_lesson_completed(request, enrollment_id, lesson_id):
 @permission_classes([IsAuthenticated, IsStudentUser])
 def mark_lesson_incomplete(request, enrollment_id, lesson_id):
     try:
-        enrollment = Enrollment.objects.get(id=enrollment_id, user=request.user)
+        enrollment = Enrollment.objects.select_related('course').get(id=enrollment_id, user=request.user)
         lesson = Lesson.objects.get(id=lesson_id, course=enrollment.course)
     except (Enrollment.DoesNotExist, Lesson.DoesNotExist):
         return Response({"detail": "Not found"}, status=status.HTTP_404_NOT_FOUND)
 
+    if completion_queue.is_enabled():
+        completion_queue.enqueue(enrollment.pk, lesson.pk, completed=False)
+        bump_completion_version(enrollment.course_id, request.user.pk)
+        return queued_completion_response(enrollment, lesson_id, "Lesson marked as incomplete", False)
+
     if not enrollment.completed_lessons.filter(id=lesson_id).exists():
         return Response({
             "detail": "Lesson not marked as completed",
@@ -620,9 +897,7 @@ def mark_lesson_incomplete(request, enrollment_id, lesson_id):
             "lesson_id": lesson_id
         }, status=status.HTTP_200_OK)
 
-    enrollment.completed_lessons.remove(lesson)
-    enrollment.update_progress()
-    LessonCompletion.objects.filter(enrollment=enrollment, lesson=lesson).delete()
+    enrollment.apply_lesson_completions(incomplete=[lesson.pk])
 
     return Response({
         "detail": "Lesson marked as incomplete",
@@ -634,30 +909,191 @@ def mark_lesson_incomplete(request, enrollment_id, lesson_id):
     })
 
 
+def queued_completion_response(enrollment, lesson_id, detail, is_completed):
+    """Response for a write-behind completion, with progress as it will be once flushed"""
+    completed_lessons, progress = completion_queue.optimistic_state(enrollment)
+    return Response({
+        "detail": detail,
+        "progress": progress,
+        "is_completed": is_completed,
+        "lesson_id": lesson_id,
+        "is_course_completed": progress == 100,
+        "completed_lessons": completed_lessons,
+        "queued": True,
+    })
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def course_progress_jobs(request, course_id):
+    """Status of the latest progress recomputes for one of the teacher's courses"""
+    if not Course.objects.filter(pk=course_id, instructor=request.user).exists():
+        return Response({"detail": "Not found"}, status=status.HTTP_404_NOT_FOUND)
+
+    jobs = ProgressRecomputeJob.objects.filter(course_id=course_id).order_by('-created_at')[:10]
+    return Response(ProgressRecomputeJobSerializer(jobs, many=True).data)
+
+
+@swagger_auto_schema(method='post', request_body=LessonCompletionBatchSerializer)
+@api_view(['POST'])
+@permission_classes([IsAuthenticated, IsStudentUser])
+def update_lesson_completions(request, enrollment_id):
+    """Applies a batch of lesson completions, e.g. synced from an offline player"""
+    serializer = LessonCompletionBatchSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    completed = set(serializer.validated_data['completed'])
+    incomplete = set(serializer.validated_data['incomplete'])
+
+    try:
+        enrollment = Enrollment.objects.select_related('course').get(id=enrollment_id, user=request.user)
+    except Enrollment.DoesNotExist:
+        return Response({"detail": "Not found"}, status=status.HTTP_404_NOT_FOUND)
+
+    requested = completed | incomplete
+    found = set(Lesson.objects.filter(
+        course_id=enrollment.course_id, id__in=requested
+    ).values_list('id', flat=True))
+    if requested - found:
+        return Response(
+            {"detail": "Lessons not found in this course", "missing": sorted(requested - found)},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    if completion_queue.is_enabled():
+        # Queued behind earlier clicks, so the flusher applies them in order
+        completion_queue.enqueue_many(enrollment.pk, completed=completed, incomplete=incomplete)
+        bump_completion_version(enrollment.course_id, request.user.pk)
+        completed_lessons, progress = completion_queue.optimistic_state(enrollment)
+        return Response({
+            "detail": "Lesson completions updated",
+            "progress": progress,
+            "is_course_completed": progress == 100,
+            "completed_lessons": completed_lessons,
+            "queued": True,
+        })
+
+    enrollment.apply_lesson_completions(completed=completed, incomplete=incomplete)
+
+    return Response({
+        "detail": "Lesson completions updated",
+        "progress": enrollment.progress,
+        "is_course_completed": enrollment.is_completed,
+        "completed_lessons": list(enrollment.completed_lessons.values_list('id', flat=True))
+    })
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated, IsStudentUser])
 def get_course_progress(request, course_id):
     try:
-        enrollment = Enrollment.objects.get(user=request.user, course_id=course_id)
-        total_lessons = Lesson.objects.filter(course_id=course_id).count()
-        completed_lessons = enrollment.completed_lessons.count()
-        
-        # Get detailed progress
-        lessons = Lesson.objects.filter(course_id=course_id).annotate(
-            is_completed=Exists(
-                enrollment.completed_lessons.filter(pk=OuterRef('pk'))
-            )
-        ).order_by('sequence_number')
+        enrollment = Enrollment.objects.select_related('course').get(
+            user=request.user, course_id=course_id
+        )
+        total_lessons = enrollment.course.active_lessons
+        progress, is_course_completed = enrollment.progress, enrollment.is_completed
         
-        lesson_serializer = LessonSerializer(lessons, many=True)
+        # Get detailed progress, reading completion from the enrollment's bitmap
+        lessons = Lesson.objects.filter(course_id=course_id).order_by('sequence_number')
+        lesson_data = LessonSerializer(lessons, many=True).data
+        if completion_queue.is_enabled():
+            # Include queued events; the flush worker hasn't applied them yet
+            completed_ids, progress = completion_queue.optimistic_state(enrollment)
+            completed_ids = set(completed_ids)
+            is_course_completed = progress == 100
+            for item in lesson_data:
+                item['is_completed'] = item['id'] in completed_ids
+        else:
+            completed_positions = enrollment.completed_positions
+            for lesson, item in zip(lessons, lesson_data):
+                item['is_completed'] = lesson.completion_slot in completed_positions
+        completed_lessons = sum(
+            1 for item in lesson_data if item['is_active'] and item['is_completed']
+        )
         
         return Response({
             'course_id': course_id,
             'total_lessons': total_lessons,
             'completed_lessons': completed_lessons,
-            'progress_percentage': enrollment.progress,
-            'is_course_completed': enrollment.is_completed,
-            'lessons': lesson_serializer.data
+            'progress_percentage': progress,
+            'is_course_completed': is_course_completed,
+            'lessons': lesson_data
         })
     except Enrollment.DoesNotExist:
-        return Response({"detail": "Not enrolled in this course"}, status=status.HTTP_404_NOT_FOUND)
\ No newline at end of file
+        return Response({"detail": "Not enrolled in this course"}, status=status.HTTP_404_NOT_FOUND)
+
+PLAYER_LESSON_FIELDS = ('id', 'title', 'description', 'video', 'duration', 'is_preview', 'sequence_number')
+
+
+def build_course_player(user, course_id):
+    """
+    The player payload for a student: active lessons grouped by section with
+    completion flags, totals and the next lesson, from one query plus any
+    queued completions. Returns None when the user isn't enrolled.
+    """
+    completions = LessonCompletion.objects.filter(
+        lesson=OuterRef('pk'), enrollment__user=user, enrollment__course_id=course_id
+    )
+    enrollments = Enrollment.objects.filter(user=user, course_id=course_id, is_active=True)
+    rows = list(Lesson.objects.filter(course_id=course_id, is_active=True).annotate(
+        completed_at=Subquery(completions.values('completed_at')[:1]),
+        enrollment_id=Subquery(enrollments.values('pk')[:1]),
+    ).order_by('sequence_number').values(
+        *PLAYER_LESSON_FIELDS, 'section_id', 'section__title', 'completed_at', 'enrollment_id'
+    ))
+
+    if rows:
+        enrollment_id = rows[0]['enrollment_id']
+    else:
+        enrollment_id = enrollments.values_list('pk', flat=True).first()
+    if enrollment_id is None:
+        return None
+
+    # Queued events the flush worker hasn't applied yet
+    pending = completion_queue.pending_for(enrollment_id) if completion_queue.is_enabled() else {}
+    for row in rows:
+        row['is_completed'] = pending.get(row['id'], row['completed_at'] is not None)
+        if not row['is_completed']:
+            row['completed_at'] = None
+
+    sections = {}
+    next_lesson = None
+    for row in rows:
+        lesson = {field: row[field] for field in PLAYER_LESSON_FIELDS}
+        lesson['is_completed'] = row['is_completed']
+        lesson['completed_at'] = row['completed_at']
+        if next_lesson is None and not lesson['is_completed']:
+            next_lesson = {'id': row['id'], 'title': row['title'], 'section_id': row['section_id']}
+
+        # Sections appear in the order of their first lesson
+        section = sections.setdefault(row['section_id'], {
+            'id': row['section_id'], 'title': row['section__title'], 'lessons': []
+        })
+        section['lessons'].append(lesson)
+
+    completed = sum(1 for row in rows if row['is_completed'])
+    return {
+        'course_id': course_id,
+        'total_lessons': len(rows),
+        'completed_lessons': completed,
+        'progress_percentage': int(completed / len(rows) * 100) if rows else 0,
+        'total_duration': sum(parse_duration(row['duration']) for row in rows),
+        'last_completed_at': max(
+            (row['completed_at'] for row in rows if row['completed_at'] is not None), default=None
+        ),
+        'next_lesson': next_lesson,
+        'sections': list(sections.values()),
+    }
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, IsStudentUser])
+def course_player(request, course_id):
+    """Lessons by section with completion state, for the course player sidebar"""
+    cache_key = course_player_cache_key(course_id, request.user.pk)
+    data = cache.get(cache_key)
+    if data is None:
+        data = build_course_player(request.user, course_id)
+        if data is None:
+            return Response({"detail": "Not enrolled in this course"}, status=status.HTTP_404_NOT_FOUND)
+        cache.set(cache_key, data, COURSE_PLAYER_CACHE_TIMEOUT)
+    return Response(data)
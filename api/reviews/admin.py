@@ -13,11 +13,11 @@ class ReviewAdmin(admin.ModelAdmin):
     actions = ['approve_reviews', 'disapprove_reviews']
 
     def approve_reviews(self, request, queryset):
-        queryset.update(is_approved=True)
+        Review.set_approved(queryset, True)
     approve_reviews.short_description = "Approve selected reviews"
 
     def disapprove_reviews(self, request, queryset):
-        queryset.update(is_approved=False)
+        Review.set_approved(queryset, False)
     disapprove_reviews.short_description = "Disapprove selected reviews"
 
 
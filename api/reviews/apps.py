@@ -5,3 +5,6 @@ class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api.reviews'
     verbose_name = 'Reviews'
+
+    def ready(self):
+        from api.reviews import signals  # noqa: F401
@@ -0,0 +1,38 @@
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+from api.core.models import Course
+from api.reviews.models import Review
+
+
+class Command(BaseCommand):
+    help = (
+        "Recounts each course's rating histogram, sum and count from its "
+        "approved reviews, fixing any drift. Run periodically."
+    )
+
+    def handle(self, *args, **options):
+        stars = [f'rating_{star}' for star in Course.RATING_STARS]
+        with transaction.atomic():
+            actual = defaultdict(dict)
+            counts = Review.objects.filter(is_approved=True).values('course_id', 'rating').annotate(
+                count=Count('pk')
+            ).order_by()
+            for row in counts:
+                actual[row['course_id']][row['rating']] = row['count']
+
+            drifted = []
+            for course in Course.objects.only('rating_sum', 'rating_count', 'reviews', *stars):
+                histogram = actual.get(course.pk, {})
+                expected = {star: histogram.get(star, 0) for star in Course.RATING_STARS}
+                rating_sum = sum(star * count for star, count in expected.items())
+                rating_count = sum(expected.values())
+                stored = (course.rating_histogram, course.rating_sum, course.rating_count, course.reviews)
+                if stored != (expected, rating_sum, rating_count, rating_count):
+                    Course.set_rating_histogram(course.pk, histogram)
+                    drifted.append(course.pk)
+
+        self.stdout.write(self.style.SUCCESS(f"Reconciled {len(drifted)} course ratings"))
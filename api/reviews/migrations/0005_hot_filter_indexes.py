@@ -0,0 +1,20 @@
+# Generated by Django 5.2.3 on 2026-10-17 06:09
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_hot_filter_indexes'),
+        ('reviews', '0004_remove_review_title_alter_review_is_approved'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(condition=models.Q(('is_approved', True)), fields=['course', '-created_at'], name='review_approved_course_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+from django.db import migrations
+from django.db.models import Count, Sum
+
+
+def fill_rating_totals(apps, schema_editor):
+    Course = apps.get_model('core', 'Course')
+    Review = apps.get_model('reviews', 'Review')
+    totals = Review.objects.filter(is_approved=True).values('course_id').annotate(
+        rating_sum=Sum('rating'), rating_count=Count('pk')
+    ).order_by()
+    for row in totals:
+        Course.objects.filter(pk=row['course_id']).update(
+            rating_sum=row['rating_sum'],
+            rating_count=row['rating_count'],
+            reviews=row['rating_count'],
+            rating=round(row['rating_sum'] / row['rating_count'], 1),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_course_rating_totals'),
+        ('reviews', '0005_hot_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_rating_totals, migrations.RunPython.noop),
+    ]
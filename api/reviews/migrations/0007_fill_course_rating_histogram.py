@@ -0,0 +1,31 @@
+from collections import defaultdict
+
+from django.db import migrations
+from django.db.models import Count
+
+
+def fill_rating_histogram(apps, schema_editor):
+    Course = apps.get_model('core', 'Course')
+    Review = apps.get_model('reviews', 'Review')
+    histograms = defaultdict(dict)
+    counts = Review.objects.filter(is_approved=True).values('course_id', 'rating').annotate(
+        count=Count('pk')
+    ).order_by()
+    for row in counts:
+        histograms[row['course_id']][row['rating']] = row['count']
+    for course_id, stars in histograms.items():
+        Course.objects.filter(pk=course_id).update(
+            **{f'rating_{star}': stars.get(star, 0) for star in range(1, 6)}
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_course_rating_histogram'),
+        ('reviews', '0006_fill_course_rating_totals'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_rating_histogram, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.3 on 2026-10-17 06:42
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+from django.db.models.functions import Cast, Coalesce, Greatest, NullIf, Sqrt
+
+
+def wilson_lower_bound(helpful, not_helpful):
+    # Frozen copy of api.reviews.models.wilson_lower_bound as of this migration
+    z = 1.96
+    helpful = Cast(helpful, models.FloatField())
+    not_helpful = Cast(not_helpful, models.FloatField())
+    total = helpful + not_helpful
+    spread = Coalesce(helpful * not_helpful / NullIf(total, 0.0), 0.0) + z ** 2 / 4
+    return Greatest((helpful + z ** 2 / 2 - z * Sqrt(spread)) / (total + z ** 2), 0.0)
+
+
+def fill_helpful_scores(apps, schema_editor):
+    Review = apps.get_model('reviews', 'Review')
+    Review.objects.exclude(helpful_count=0, not_helpful_count=0).update(
+        helpful_score=wilson_lower_bound(F('helpful_count'), F('not_helpful_count'))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_course_rating_histogram'),
+        ('reviews', '0007_fill_course_rating_histogram'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='review',
+            name='helpful_score',
+            field=models.FloatField(default=0.0, editable=False),
+        ),
+        migrations.RunPython(fill_helpful_scores, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(condition=models.Q(('is_approved', True)), fields=['course', '-helpful_score', '-id'], name='review_helpful_course_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(condition=models.Q(('is_approved', True)), fields=['course', '-rating', '-id'], name='review_rating_course_idx'),
+        ),
+    ]
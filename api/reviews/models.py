@@ -1,8 +1,30 @@
-from django.db import models
+from collections import Counter, defaultdict
+
+from django.db import models, transaction
+from django.db.models import Count, F
+from django.db.models.functions import Cast, Coalesce, Greatest, NullIf, Sqrt
+from django.utils import timezone
 from django.core.validators import MinValueValidator, MaxValueValidator
 from api.accounts.models import User
 from api.core.models import Course
 
+# z for a 95% confidence interval
+WILSON_Z = 1.96
+
+
+def wilson_lower_bound(helpful, not_helpful):
+    """
+    Query expression for the lower bound of the Wilson score interval of the
+    helpful share of votes; 0 for a review without votes. Takes counts or
+    expressions for them, so it can be used inside an UPDATE.
+    """
+    helpful = Cast(helpful, models.FloatField())
+    not_helpful = Cast(not_helpful, models.FloatField())
+    total = helpful + not_helpful
+    z2 = WILSON_Z ** 2
+    spread = Coalesce(helpful * not_helpful / NullIf(total, 0.0), 0.0) + z2 / 4
+    return Greatest((helpful + z2 / 2 - WILSON_Z * Sqrt(spread)) / (total + z2), 0.0)
+
 
 class Review(models.Model):
     RATING_CHOICES = [
@@ -26,25 +48,112 @@ class Review(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     helpful_count = models.PositiveIntegerField(default=0)
     not_helpful_count = models.PositiveIntegerField(default=0)
+    # wilson_lower_bound() of the vote counters, kept by adjust_votes for ordering
+    helpful_score = models.FloatField(default=0.0, editable=False)
 
     class Meta:
         unique_together = ('course', 'user') 
         ordering = ['-created_at']
+        indexes = [
+            models.Index(
+                fields=['course', '-created_at'], condition=models.Q(is_approved=True),
+                name='review_approved_course_idx'
+            ),
+            models.Index(
+                fields=['course', '-helpful_score', '-id'], condition=models.Q(is_approved=True),
+                name='review_helpful_course_idx'
+            ),
+            models.Index(
+                fields=['course', '-rating', '-id'], condition=models.Q(is_approved=True),
+                name='review_rating_course_idx'
+            ),
+        ]
 
     def __str__(self):
         return f"{self.user.username}'s review for {self.course.comment}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if {'course_id', 'rating', 'is_approved'} <= instance.__dict__.keys():
+            instance._stored_rating = instance.course_rating()
+        return instance
+
+    def course_rating(self):
+        """(course_id, {star: count}) this review adds to the course rating histogram"""
+        if not self.is_approved:
+            return self.course_id, {}
+        return self.course_id, {self.rating: 1}
+
+    def stored_course_rating(self):
+        """course_rating() as of the last load or save of this review"""
+        if self._state.adding:
+            return None
+        stored = getattr(self, '_stored_rating', None)
+        if stored is None:
+            previous = Review.objects.filter(pk=self.pk).only('course', 'rating', 'is_approved').first()
+            stored = previous.course_rating() if previous else None
+        return stored
+
     def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        self.update_course_rating()
+        with transaction.atomic():
+            previous = self.stored_course_rating()
+            super().save(*args, **kwargs)
+            current = self.course_rating()
+            changes = {current[0]: Counter(current[1])}
+            if previous:
+                changes.setdefault(previous[0], Counter()).subtract(previous[1])
+            for course_id, stars in changes.items():
+                Course.adjust_rating(course_id, stars)
+        self._stored_rating = current
+
+    @classmethod
+    def set_approved(cls, queryset, is_approved):
+        """
+        Approves or disapproves reviews in bulk, adjusting the course rating
+        totals by the reviews whose state actually changes.
+        """
+        with transaction.atomic():
+            changed = list(queryset.exclude(is_approved=is_approved).values_list('pk', flat=True))
+            counts = cls.objects.filter(pk__in=changed).values('course_id', 'rating').annotate(
+                count=Count('pk')
+            ).order_by()
+            sign = 1 if is_approved else -1
+            changes = defaultdict(dict)
+            for row in counts:
+                changes[row['course_id']][row['rating']] = sign * row['count']
+            for course_id, stars in changes.items():
+                Course.adjust_rating(course_id, stars)
+            return cls.objects.filter(pk__in=changed).update(
+                is_approved=is_approved, updated_at=timezone.now()
+            )
+
+    @classmethod
+    def adjust_votes(cls, review_id, helpful_delta, not_helpful_delta):
+        """
+        Applies vote changes to the counters and helpful score with one
+        UPDATE, leaving the course alone.
+        """
+        if not (helpful_delta or not_helpful_delta):
+            return
+        helpful = Greatest(F('helpful_count') + helpful_delta, 0)
+        not_helpful = Greatest(F('not_helpful_count') + not_helpful_delta, 0)
+        cls.objects.filter(pk=review_id).update(
+            # Set before the counters: MySQL evaluates later assignments
+            # against the already updated columns.
+            helpful_score=wilson_lower_bound(helpful, not_helpful),
+            helpful_count=helpful,
+            not_helpful_count=not_helpful,
+            # Moves list_reviews' ETag along with the counts
+            updated_at=timezone.now(),
+        )
 
     def update_course_rating(self):
-        reviews = Review.objects.filter(course=self.course, is_approved=True)
-        if reviews.exists():
-            avg_rating = reviews.aggregate(models.Avg('rating'))['rating__avg']
-            self.course.rating = round(avg_rating, 1)
-            self.course.reviews = reviews.count()
-            self.course.save()
+        """Recomputes the course rating totals from scratch, e.g. to repair drift"""
+        stars = Review.objects.filter(course_id=self.course_id, is_approved=True).values_list(
+            'rating'
+        ).annotate(count=Count('pk')).order_by()
+        Course.set_rating_histogram(self.course_id, dict(stars))
 
 
 class ReviewResponse(models.Model):
@@ -70,14 +179,38 @@ class ReviewVote(models.Model):
     def __str__(self):
         return f"{self.user.username} voted on {self.review}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._stored_is_helpful = instance.__dict__.get('is_helpful')
+        return instance
+
+    def counter_deltas(self, sign=1):
+        """(helpful, not helpful) deltas for adding (or with sign=-1, removing) this vote"""
+        return (sign, 0) if self.is_helpful else (0, sign)
+
     def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        self.update_review_vote_counts()
+        adding = self._state.adding
+        previous = getattr(self, '_stored_is_helpful', None)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if adding:
+                Review.adjust_votes(self.review_id, *self.counter_deltas())
+            elif previous is not None and previous != self.is_helpful:
+                # A changed vote moves one count from one counter to the other
+                delta = 1 if self.is_helpful else -1
+                Review.adjust_votes(self.review_id, delta, -delta)
+        self._stored_is_helpful = self.is_helpful
 
     def update_review_vote_counts(self):
-        helpful_count = ReviewVote.objects.filter(review=self.review, is_helpful=True).count()
-        not_helpful_count = ReviewVote.objects.filter(review=self.review, is_helpful=False).count()
-        
-        self.review.helpful_count = helpful_count
-        self.review.not_helpful_count = not_helpful_count
-        self.review.save()
\ No newline at end of file
+        """Recounts the review's vote counters from scratch, e.g. to repair drift"""
+        counts = ReviewVote.objects.filter(review_id=self.review_id).aggregate(
+            helpful=Count('pk', filter=models.Q(is_helpful=True)),
+            not_helpful=Count('pk', filter=models.Q(is_helpful=False)),
+        )
+        Review.objects.filter(pk=self.review_id).update(
+            helpful_count=counts['helpful'],
+            not_helpful_count=counts['not_helpful'],
+            helpful_score=wilson_lower_bound(counts['helpful'], counts['not_helpful']),
+            updated_at=timezone.now(),
+        )
\ No newline at end of file
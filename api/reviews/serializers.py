@@ -1,6 +1,6 @@
 from rest_framework import serializers
 from api.accounts.models import User
-from api.core.models import Course
+from api.core.models import Course, Enrollment
 from .models import Review, ReviewResponse, ReviewVote
 
 
@@ -16,6 +16,14 @@ class CourseSerializer(serializers.ModelSerializer):
         fields = ['id', 'title', 'banner']
 
 
+class CourseReviewSummarySerializer(serializers.ModelSerializer):
+    histogram = serializers.DictField(source='rating_histogram', child=serializers.IntegerField())
+
+    class Meta:
+        model = Course
+        fields = ['id', 'rating', 'reviews', 'histogram']
+
+
 class ReviewVoteSerializer(serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
 
@@ -50,6 +58,31 @@ class ReviewSerializer(serializers.ModelSerializer):
         return value
 
 
+class ReviewListSerializer(serializers.ModelSerializer):
+    """
+    Review as listed under a course: vote counters instead of the vote list,
+    plus the requesting user's own vote from ``context['my_votes']``.
+    """
+    user = UserSerializer(read_only=True)
+    response = serializers.SerializerMethodField()
+    my_vote = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Review
+        fields = [
+            'id', 'user', 'rating', 'comment', 'has_attended', 'created_at', 'updated_at',
+            'helpful_count', 'not_helpful_count', 'my_vote', 'response'
+        ]
+
+    def get_response(self, obj):
+        response = getattr(obj, 'response', None)
+        return ReviewResponseSerializer(response).data if response else None
+
+    def get_my_vote(self, obj):
+        """True for helpful, False for not helpful, None when the user hasn't voted"""
+        return self.context.get('my_votes', {}).get(obj.pk)
+
+
 class CreateReviewSerializer(serializers.ModelSerializer):
     class Meta:
         model = Review
@@ -59,7 +92,7 @@ class CreateReviewSerializer(serializers.ModelSerializer):
         user = self.context['request'].user
         course = data['course']
         
-        if not course.enrollment_set.filter(user=user, is_active=True).exists():
+        if course.pk not in Enrollment.active_course_ids(user.pk):
             raise serializers.ValidationError("You must be enrolled in the course to leave a review")
             
         if Review.objects.filter(course=course, user=user).exists():
@@ -0,0 +1,79 @@
+from collections import Counter, defaultdict
+
+from django.db.models.signals import post_delete, pre_delete
+from django.dispatch import receiver
+
+from api.core.models import Course
+from .models import Review, ReviewVote
+
+
+def cascade_state(origin):
+    """
+    Bookkeeping for one delete() call, kept on the object it was called on.
+
+    Every pre_delete of a call is sent before its first post_delete, so the
+    pre_delete receivers count the rows and note the courses going away,
+    and the post_delete receivers apply the collected changes once, after
+    the last row, skipping rows that are deleted themselves.
+    """
+    state = getattr(origin, '_review_cascade', None)
+    if state is None:
+        state = {
+            'courses': set(),
+            'reviews': set(),
+            'pending': Counter(),
+            'ratings': defaultdict(Counter),
+            'votes': defaultdict(lambda: [0, 0]),
+        }
+        if origin is not None:
+            origin._review_cascade = state
+    return state
+
+
+@receiver(pre_delete, sender=Course)
+def note_deleted_course(sender, instance, origin=None, **kwargs):
+    cascade_state(origin)['courses'].add(instance.pk)
+
+
+@receiver(pre_delete, sender=Review)
+def note_deleted_review(sender, instance, origin=None, **kwargs):
+    state = cascade_state(origin)
+    state['reviews'].add(instance.pk)
+    state['pending']['reviews'] += 1
+
+
+@receiver(pre_delete, sender=ReviewVote)
+def note_deleted_vote(sender, instance, origin=None, **kwargs):
+    cascade_state(origin)['pending']['votes'] += 1
+
+
+@receiver(post_delete, sender=Review)
+def remove_review_from_course_rating(sender, instance, origin=None, **kwargs):
+    # Covers cascades from users and courses, which skip Review.delete()
+    state = cascade_state(origin)
+    course_id, stars = instance.stored_course_rating() or instance.course_rating()
+    state['ratings'][course_id].subtract(stars)
+    state['pending']['reviews'] -= 1
+    if state['pending']['reviews'] > 0:
+        return
+
+    ratings, state['ratings'] = state['ratings'], defaultdict(Counter)
+    for course_id, stars in ratings.items():
+        if course_id not in state['courses']:
+            Course.adjust_rating(course_id, stars)
+
+
+@receiver(post_delete, sender=ReviewVote)
+def retract_review_vote(sender, instance, origin=None, **kwargs):
+    state = cascade_state(origin)
+    deltas = state['votes'][instance.review_id]
+    for index, delta in enumerate(instance.counter_deltas(sign=-1)):
+        deltas[index] += delta
+    state['pending']['votes'] -= 1
+    if state['pending']['votes'] > 0:
+        return
+
+    votes, state['votes'] = state['votes'], defaultdict(lambda: [0, 0])
+    for review_id, (helpful, not_helpful) in votes.items():
+        if review_id not in state['reviews']:
+            Review.adjust_votes(review_id, helpful, not_helpful)
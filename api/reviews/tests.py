@@ -1,3 +1,250 @@
-from django.test import TestCase
+from io import StringIO
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from api.core.models import Course
+from api.core.testing import CourseTestCase, create_user
+from .models import Review, ReviewResponse, ReviewVote
+
+
+def course_updates(queries):
+    return [
+        query['sql'] for query in queries.captured_queries
+        if query['sql'].startswith('UPDATE "core_course"')
+    ]
+
+
+class CourseRatingTests(CourseTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.students = [create_user(f'student{index}') for index in range(3)]
+
+    def review(self, student, rating):
+        return Review.objects.create(course=self.course, user=student, rating=rating, comment='Good')
+
+    def rating(self):
+        self.course.refresh_from_db()
+        return self.course.rating, self.course.reviews, self.course.rating_sum
+
+    def test_totals_follow_review_changes(self):
+        first = self.review(self.students[0], 5)
+        self.review(self.students[1], 4)
+        self.assertEqual(self.rating(), (4.5, 2, 9))
+
+        first = Review.objects.get(pk=first.pk)
+        first.rating = 2
+        first.save()
+        self.assertEqual(self.rating(), (3.0, 2, 6))
+
+        first.is_approved = False
+        first.save()
+        self.assertEqual(self.rating(), (4.0, 1, 4))
+
+        first.delete()
+        self.assertEqual(self.rating(), (4.0, 1, 4))
+
+        self.students[1].delete()
+        self.assertEqual(self.rating(), (0.0, 0, 0))
+
+    def test_bulk_approval_adjusts_totals(self):
+        for student, rating in zip(self.students, [5, 4, 3]):
+            self.review(student, rating)
+        reviews = Review.objects.filter(course=self.course)
+
+        self.assertEqual(Review.set_approved(reviews.filter(rating__gte=4), False), 2)
+        self.assertEqual(self.rating(), (3.0, 1, 3))
+
+        # Already approved reviews aren't counted twice
+        self.assertEqual(Review.set_approved(reviews, True), 2)
+        self.assertEqual(self.rating(), (4.0, 3, 12))
+
+    def test_cascaded_deletes_adjust_each_course_once(self):
+        for student, rating in zip(self.students, [5, 4, 3]):
+            self.review(student, rating)
+
+        with CaptureQueriesContext(connection) as queries:
+            Review.objects.filter(rating__gte=4).delete()
+        self.assertEqual(len(course_updates(queries)), 1)
+        self.assertEqual(self.rating(), (3.0, 1, 3))
+
+        # The course row goes away with its reviews, so there is nothing to adjust
+        with CaptureQueriesContext(connection) as queries:
+            Course.objects.filter(pk=self.course.pk).delete()
+        self.assertEqual(course_updates(queries), [])
+
+    def test_reconcile_command_fixes_drift(self):
+        self.review(self.students[0], 5)
+        self.review(self.students[1], 3)
+        Course.objects.filter(pk=self.course.pk).update(rating_sum=1, rating_5=4, reviews=9)
+
+        call_command('reconcile_course_ratings', stdout=StringIO())
+        self.assertEqual(self.rating(), (4.0, 2, 8))
+        self.assertEqual(self.course.rating_histogram, {1: 0, 2: 0, 3: 1, 4: 0, 5: 1})
+
+    def test_histogram_follows_review_changes(self):
+        first = self.review(self.students[0], 5)
+        self.review(self.students[1], 5)
+        self.review(self.students[2], 3)
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.rating_histogram, {1: 0, 2: 0, 3: 1, 4: 0, 5: 2})
+
+        first = Review.objects.get(pk=first.pk)
+        first.rating = 1
+        first.save()
+        Review.set_approved(Review.objects.filter(rating=3), False)
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.rating_histogram, {1: 1, 2: 0, 3: 0, 4: 0, 5: 1})
+        self.assertEqual(self.rating(), (3.0, 2, 6))
+
+        first.update_course_rating()
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.rating_histogram, {1: 1, 2: 0, 3: 0, 4: 0, 5: 1})
+
+    def test_summary_endpoint_is_cached_until_ratings_change(self):
+        cache.clear()
+        url = f'/api/courses/{self.course.pk}/reviews/summary/'
+        self.review(self.students[0], 4)
+
+        response = APIClient().get(url)
+        self.assertEqual(response.data['reviews'], 1)
+        self.assertEqual(response.data['histogram'], {'1': 0, '2': 0, '3': 0, '4': 1, '5': 0})
+        with self.assertNumQueries(0):
+            APIClient().get(url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.review(self.students[1], 2)
+        response = APIClient().get(url)
+        self.assertEqual(response.data['rating'], 3.0)
+        self.assertEqual(response.data['histogram']['2'], 1)
+
+
+class ReviewVoteTests(CourseTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        author = create_user('author')
+        cls.review = Review.objects.create(course=cls.course, user=author, rating=5, comment='Good')
+        cls.voter = create_user('voter')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.voter)
+        self.url = f'/api/reviews/{self.review.pk}/vote/'
+
+    def counts(self):
+        self.review.refresh_from_db()
+        return self.review.helpful_count, self.review.not_helpful_count
+
+    def test_vote_change_and_retraction_are_deltas(self):
+        course_updated_at = Course.objects.get().updated_at
+
+        response = self.client.post(self.url, {'is_helpful': True}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.counts(), (1, 0))
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.url, {'is_helpful': False}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.counts(), (0, 1))
+        self.assertFalse(any('core_course' in query['sql'] and query['sql'].startswith('UPDATE')
+                             for query in queries.captured_queries))
+
+        self.assertEqual(self.client.delete(self.url).status_code, 204)
+        self.assertEqual(self.counts(), (0, 0))
+        self.assertEqual(self.client.delete(self.url).status_code, 404)
+        self.assertEqual(Course.objects.get().updated_at, course_updated_at)
+
+    def test_deleting_a_review_skips_its_vote_counters(self):
+        self.client.post(self.url, {'is_helpful': True}, format='json')
+        ReviewVote.objects.create(review=self.review, user=create_user('second'), is_helpful=False)
+        self.assertEqual(self.counts(), (1, 1))
+
+        with CaptureQueriesContext(connection) as queries:
+            Review.objects.get(pk=self.review.pk).delete()
+        self.assertFalse(any(query['sql'].startswith('UPDATE "reviews_review"')
+                             for query in queries.captured_queries))
+
+    def test_helpful_score_follows_counters(self):
+        self.client.post(self.url, {'is_helpful': True}, format='json')
+        self.review.refresh_from_db()
+        self.assertAlmostEqual(self.review.helpful_score, 0.2065, places=4)
+
+        self.client.post(self.url, {'is_helpful': False}, format='json')
+        self.review.refresh_from_db()
+        self.assertAlmostEqual(self.review.helpful_score, 0.0)
+
+        ReviewVote.objects.update(is_helpful=True)
+        ReviewVote.objects.get().update_review_vote_counts()
+        self.review.refresh_from_db()
+        self.assertAlmostEqual(self.review.helpful_score, 0.2065, places=4)
+
+
+class ListReviewsTests(CourseTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.voter = create_user('voter')
+        cls.reviews = []
+        for index in range(20):
+            author = create_user(f'author{index}')
+            review = Review.objects.create(course=cls.course, user=author, rating=4, comment='Good')
+            ReviewVote.objects.create(review=review, user=cls.voter, is_helpful=index % 2 == 0)
+            cls.reviews.append(review)
+        ReviewResponse.objects.create(review=cls.reviews[-1], instructor=cls.teacher, response_text='Thanks')
+
+    def test_cursor_pages_with_constant_queries(self):
+        client = APIClient()
+        client.force_authenticate(self.voter)
+        url = f'/api/courses/{self.course.pk}/reviews/?ordering=newest'
+
+        # ETag aggregate + reviews joined with users and responses + my votes
+        with self.assertNumQueries(3):
+            response = client.get(url)
+        first = response.data['results'][0]
+        self.assertEqual(first['id'], self.reviews[-1].pk)
+        self.assertEqual(first['my_vote'], False)
+        self.assertEqual(first['response']['response_text'], 'Thanks')
+        self.assertNotIn('votes', first)
+        self.assertNotIn('course', first)
+
+        response = client.get(response.data['next'])
+        self.assertEqual(len(response.data['results']), 4)
+        self.assertIsNone(response.data['next'])
+        self.assertIsNone(response.data['results'][0]['response'])
+
+    def test_instructor_responses_move_the_etag(self):
+        client = APIClient()
+        client.force_authenticate(self.voter)
+        url = f'/api/courses/{self.course.pk}/reviews/'
+        etag = client.get(url).headers['ETag']
+
+        response = ReviewResponse.objects.create(
+            review=self.reviews[0], instructor=self.teacher, response_text='Noted'
+        )
+        new_etag = client.get(url, HTTP_IF_NONE_MATCH=etag).headers['ETag']
+        self.assertNotEqual(new_etag, etag)
+
+        response.response_text = 'Fixed in the next release'
+        response.save()
+        self.assertEqual(client.get(url, HTTP_IF_NONE_MATCH=new_etag).status_code, 200)
+
+    def test_orderings(self):
+        client = APIClient()
+        client.force_authenticate(self.voter)
+        url = f'/api/courses/{self.course.pk}/reviews/'
+        self.reviews[3].rating = 5
+        self.reviews[3].save()
+
+        # Reviews with a helpful vote outrank the rest, newest first on ties
+        helpful = [review['id'] for review in client.get(url, {'limit': 10}).data['results']]
+        self.assertEqual(helpful, [review.pk for review in self.reviews[-2::-2]])
+
+        response = client.get(url, {'ordering': 'rating'})
+        self.assertEqual(response.data['results'][0]['id'], self.reviews[3].pk)
+
+        self.assertEqual(client.get(url, {'ordering': 'votes'}).status_code, 400)
@@ -1,6 +1,7 @@
 from django.urls import path
 from .views import (
     list_reviews,
+    course_review_summary,
     create_review,
     review_detail,
     update_review,
@@ -13,6 +14,7 @@ from .views import (
 urlpatterns = [
     # Course reviews
     path('courses/<int:course_id>/reviews/', list_reviews, name='list-reviews'),
+    path('courses/<int:course_id>/reviews/summary/', course_review_summary, name='course-review-summary'),
     path('courses/<int:course_id>/reviews/create/', create_review, name='create-review'),
     
     # Single review operations
@@ -1,12 +1,19 @@
 from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
 from drf_yasg.utils import swagger_auto_schema
+from django.core.cache import cache
+from django.db.models import Max, Count
+from api.core.caching import COURSE_DETAIL_CACHE_TIMEOUT, course_review_summary_cache_key
+from api.core.conditional import conditional_view
+from api.core.pagination import KeysetPagination
 from api.core.models import Course
-from .models import Review, ReviewResponse
+from .models import Review, ReviewResponse, ReviewVote
 from .serializers import (
     ReviewSerializer,
+    ReviewListSerializer,
+    CourseReviewSummarySerializer,
     CreateReviewSerializer,
     ReviewResponseSerializer,
     ReviewVoteSerializer,
@@ -14,12 +21,74 @@ from .serializers import (
 )
 
 
-@swagger_auto_schema(method='get', responses={200: ReviewSerializer(many=True)})
+# ?ordering= options for list_reviews; each ends in id for stable keyset pages
+REVIEW_ORDERINGS = {
+    'helpful': ('-helpful_score', '-id'),
+    'newest': ('-created_at', '-id'),
+    'rating': ('-rating', '-id'),
+}
+
+
+def list_reviews_state(request, course_id):
+    stats = Review.objects.filter(course_id=course_id, is_approved=True).aggregate(
+        latest=Max('updated_at'),
+        count=Count('id'),
+        responses_latest=Max('response__updated_at'),
+        responses=Count('response'),
+    )
+    # my_vote differs per user, so the user is part of the validator
+    return (
+        stats['count'], stats['latest'], stats['responses'], stats['responses_latest'],
+        request.user.pk,
+    )
+
+
+@swagger_auto_schema(method='get', responses={200: ReviewListSerializer(many=True)})
 @api_view(['GET'])
+@conditional_view(list_reviews_state)
 def list_reviews(request, course_id):
-    reviews = Review.objects.filter(course_id=course_id, is_approved=True).order_by('-created_at')
-    serializer = ReviewSerializer(reviews, many=True)
-    return Response(serializer.data)
+    """Approved reviews of a course, most helpful first, in cursor pages (?cursor=, ?limit=)"""
+    ordering = request.query_params.get('ordering', 'helpful')
+    if ordering not in REVIEW_ORDERINGS:
+        return Response(
+            {'ordering': f"Must be one of: {', '.join(REVIEW_ORDERINGS)}"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    reviews = Review.objects.filter(course_id=course_id, is_approved=True).select_related(
+        'user', 'response__instructor'
+    )
+    paginator = KeysetPagination(REVIEW_ORDERINGS[ordering])
+    page = paginator.paginate_queryset(reviews, request)
+
+    my_votes = {}
+    if page:
+        my_votes = dict(ReviewVote.objects.filter(
+            user=request.user, review_id__in=[review.pk for review in page]
+        ).values_list('review_id', 'is_helpful'))
+    serializer = ReviewListSerializer(page, many=True, context={'my_votes': my_votes})
+    return paginator.get_paginated_response(serializer.data)
+
+
+@swagger_auto_schema(method='get', responses={200: CourseReviewSummarySerializer, 404: 'Not Found'})
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def course_review_summary(request, course_id):
+    """Rating, review count and 1-5 star histogram of a course, from its stored counters"""
+    cache_key = course_review_summary_cache_key(course_id)
+    data = cache.get(cache_key)
+    if data is not None:
+        return Response(data)
+
+    course = Course.objects.filter(pk=course_id).only(
+        'rating', 'reviews', *(f'rating_{star}' for star in Course.RATING_STARS)
+    ).first()
+    if course is None:
+        return Response({'error': 'Course not found'}, status=status.HTTP_404_NOT_FOUND)
+
+    data = CourseReviewSummarySerializer(course).data
+    cache.set(cache_key, data, COURSE_DETAIL_CACHE_TIMEOUT)
+    return Response(data)
 
 
 @swagger_auto_schema(
@@ -151,11 +220,13 @@ def create_review_response(request, review_id):
 @swagger_auto_schema(
     method='post',
     request_body=CreateReviewVoteSerializer,
-    responses={201: ReviewVoteSerializer, 400: 'Bad Request'}
+    responses={200: ReviewVoteSerializer, 201: ReviewVoteSerializer, 400: 'Bad Request'}
 )
-@api_view(['POST'])
+@swagger_auto_schema(method='delete', responses={204: 'Vote retracted', 404: 'Not Found'})
+@api_view(['POST', 'DELETE'])
 @permission_classes([IsAuthenticated])
 def vote_review(request, review_id):
+    """POST casts or changes the user's vote; DELETE retracts it"""
     try:
         review = Review.objects.get(pk=review_id, is_approved=True)
     except Review.DoesNotExist:
@@ -167,6 +238,20 @@ def vote_review(request, review_id):
             status=status.HTTP_403_FORBIDDEN
         )
 
+    vote = ReviewVote.objects.filter(review=review, user=request.user).first()
+    if request.method == 'DELETE':
+        if vote is None:
+            return Response({'error': 'Vote not found'}, status=status.HTTP_404_NOT_FOUND)
+        vote.delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    if vote is not None:
+        serializer = ReviewVoteSerializer(vote, data={'is_helpful': request.data.get('is_helpful')}, partial=True)
+        if serializer.is_valid():
+            vote = serializer.save()
+            return Response(ReviewVoteSerializer(vote).data)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
     data = request.data.copy()
     data['review'] = review_id
     serializer = CreateReviewVoteSerializer(data=data, context={'request': request})
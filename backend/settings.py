@@ -117,6 +117,39 @@ MEDIA_URL = "/media/"
 
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
+# Precompressed anonymous catalog pages (see api/core/snapshot.py)
+CATALOG_SNAPSHOT_DIR = os.path.join(STATIC_ROOT, 'catalog')
+CATALOG_SNAPSHOT_PAGES = int(os.getenv('CATALOG_SNAPSHOT_PAGES', 5))
+
+# Cached payloads are invalidated by bumping version keys in the cache (see
+# api/core/caching.py), so every web worker and management command has to
+# share one cache. The file-based default covers any number of processes on
+# one host; point CACHE_BACKEND/CACHE_LOCATION at Redis or Memcached for more.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', os.path.join(BASE_DIR, 'cache')),
+    }
+}
+# A process-local cache (LocMemCache) is refused by check core.E001 unless
+# this declares that a single process serves requests and runs the commands
+CACHE_SINGLE_PROCESS = os.getenv('CACHE_SINGLE_PROCESS', 'False').lower() == 'true'
+
+# Course search backend (dotted path). Unset uses SQLite FTS5 when available.
+COURSE_SEARCH_BACKEND = os.getenv('COURSE_SEARCH_BACKEND')
+
+# Enrollment counters: courses with at least this many students spread
+# counter writes over STUDENT_COUNT_SHARDS rows (see reconcile_student_counts)
+STUDENT_COUNT_HOT_THRESHOLD = int(os.getenv('STUDENT_COUNT_HOT_THRESHOLD', 1000))
+STUDENT_COUNT_SHARDS = 8
+
+# Write-behind lesson completion: events are queued in a local SQLite file and
+# applied by the flush_completion_queue worker (see api/core/completion_queue.py)
+LESSON_COMPLETION_WRITE_BEHIND = os.getenv('LESSON_COMPLETION_WRITE_BEHIND', 'False').lower() == 'true'
+LESSON_COMPLETION_QUEUE_PATH = os.getenv(
+    'LESSON_COMPLETION_QUEUE_PATH', os.path.join(BASE_DIR, 'completion_queue.sqlite3')
+)
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 